@@ -0,0 +1,283 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+
+# Chạy từ thư mục gốc: python bench/benchmark.py --pages 1000,10000
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from notion_api import NotionClient, NotionError, PRIORITY_INTERACTIVE, PRIORITY_POLL
+from catalog import Catalog
+from records import AnimeRecord
+from fake_notion import FakeNotion, SUMMARIES, generate_catalog, prop_value
+
+# ==========================================
+# ĐO ĐẠC
+# ==========================================
+def percentile(samples, pct):
+    if not samples: return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+def summarize(name, samples, elapsed, units=None):
+    # units: số "đơn vị" xử lý được (trang, truy vấn...) để tính thông lượng
+    units = len(samples) if units is None else units
+    return {
+        "name": name,
+        "count": len(samples),
+        "p50_ms": percentile(samples, 50) * 1000,
+        "p99_ms": percentile(samples, 99) * 1000,
+        "max_ms": max(samples) * 1000 if samples else 0.0,
+        "throughput": units / elapsed if elapsed else 0.0,
+        "elapsed_s": elapsed,
+    }
+
+class TimedClient(NotionClient):
+    # Ghi thời gian mỗi lần gọi _request (gồm cả chờ bộ điều phối + thử lại)
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.samples = []
+
+    async def _request(self, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return await super()._request(*args, **kwargs)
+        finally:
+            self.samples.append(time.perf_counter() - start)
+
+async def timed_many(make_call, count, concurrency):
+    # Lỗi Notion (hết lượt thử lại) chỉ được đếm, không dừng cả kịch bản
+    samples = []
+    errors = 0
+    sem = asyncio.Semaphore(concurrency)
+    async def one(i):
+        nonlocal errors
+        async with sem:
+            start = time.perf_counter()
+            try:
+                await make_call(i)
+            except NotionError:
+                errors += 1
+                return
+            samples.append(time.perf_counter() - start)
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(count)))
+    return samples, time.perf_counter() - start, errors
+
+def time_local(func, inputs):
+    samples = []
+    start = time.perf_counter()
+    for value in inputs:
+        t = time.perf_counter()
+        func(value)
+        samples.append(time.perf_counter() - t)
+    return samples, time.perf_counter() - start
+
+# ==========================================
+# CÁC KỊCH BẢN
+# ==========================================
+def search_queries(pages, count, rng):
+    # Trộn: tên đầy đủ, 1 từ, tiền tố ngắn, gõ sai 1 ký tự, tên tiếng Việt
+    titles = [prop_value(p, "Tên Romanji") for p in pages]
+    english = [prop_value(p, "Tên tiếng Anh") for p in pages]
+    queries = []
+    for i in range(count):
+        title = rng.choice(titles)
+        kind = i % 5
+        if kind == 0:
+            queries.append(title)
+        elif kind == 1:
+            queries.append(rng.choice(title.split()))
+        elif kind == 2:
+            queries.append(title[:3])
+        elif kind == 3:
+            pos = rng.randrange(len(title))
+            queries.append(title[:pos] + "x" + title[pos + 1:])
+        else:
+            queries.append(rng.choice(english))
+    return queries
+
+def text_queries(pages, count, rng):
+    # Cụm từ trong tóm tắt, nhóm dịch, tên tiếng Việt
+    phrases = [p for s in SUMMARIES for p in s.rstrip(".").split(", ")]
+    groups = [prop_value(p, "Bản quyền/Nhóm dịch")[0] for p in pages]
+    english = [prop_value(p, "Tên tiếng Anh") for p in pages]
+    pools = (phrases, groups, english)
+    return [rng.choice(pools[i % 3]) for i in range(count)]
+
+async def bench_full_sync(client, parts=1):
+    catalog = Catalog()
+    client.samples.clear()
+    start = time.perf_counter()
+    def stream_all(filter_payload, partitioned=False):
+        return client.query_partitioned(filter_payload, parts=parts if partitioned else 1, site="bench_full_sync")
+    await catalog.load(stream_all)
+    elapsed = time.perf_counter() - start
+    name = "full_sync" if parts <= 1 else f"full_sync_p{parts}"
+    row = summarize(name, client.samples, elapsed, units=len(catalog))
+    row["unit"] = "trang/s"
+    return catalog, row
+
+async def bench_poll(client, server, catalog, rounds, touched, rng):
+    # Giống check_new_anime ở chế độ delta: sửa vài trang rồi quét từ watermark
+    samples = []
+    seen = 0
+    ids = [i for i, p in server.pages.items() if prop_value(p, "Public")]
+    start = time.perf_counter()
+    for _ in range(rounds):
+        server.touch(rng.sample(ids, touched))
+        watermark = catalog.watermark
+        poll_filter = {
+            "filter": {
+                "and": [
+                    { "property": "Public", "checkbox": { "equals": True } },
+                    { "timestamp": "last_edited_time", "last_edited_time": { "on_or_after": watermark } }
+                ]
+            }
+        }
+        t = time.perf_counter()
+        pages = await client.query_all(poll_filter, priority=PRIORITY_POLL, site="bench_poll")
+        records = [AnimeRecord.from_page(p) for p in pages]
+        catalog.apply(records)
+        samples.append(time.perf_counter() - t)
+        seen += len(records)
+    row = summarize("incremental_poll", samples, time.perf_counter() - start, units=seen)
+    row["unit"] = "trang/s"
+    return row
+
+def bench_local_search(catalog, queries):
+    samples, elapsed = time_local(catalog.search_titles, queries)
+    row = summarize("search_local", samples, elapsed)
+    row["unit"] = "truy vấn/s"
+    return row
+
+async def bench_live_search(client, queries, concurrency):
+    async def call(i):
+        q = queries[i]
+        await client.query({
+            "filter": {
+                "and": [
+                    { "property": "Public", "checkbox": { "equals": True } },
+                    { "or": [
+                        { "property": "Tên Romanji", "title": { "contains": q } },
+                        { "property": "Tên tiếng Anh", "rich_text": { "contains": q } }
+                    ]}
+                ]
+            }
+        }, priority=PRIORITY_INTERACTIVE, site="bench_search")
+    samples, elapsed, errors = await timed_many(call, len(queries), concurrency)
+    row = summarize("search_notion", samples, elapsed)
+    row["errors"] = errors
+    row["unit"] = "truy vấn/s"
+    return row
+
+def bench_local_text(catalog, queries):
+    samples, elapsed = time_local(catalog.search_text, queries)
+    row = summarize("search_text_local", samples, elapsed)
+    row["unit"] = "truy vấn/s"
+    return row
+
+def bench_local_series(catalog, names):
+    samples, elapsed = time_local(catalog.series_members, names)
+    row = summarize("series_local", samples, elapsed)
+    row["unit"] = "truy vấn/s"
+    return row
+
+async def bench_live_series(client, names, concurrency):
+    async def call(i):
+        await client.query({
+            "filter": {
+                "and": [
+                    { "property": "Loạt phim", "rich_text": { "equals": names[i] } },
+                    { "property": "Public", "checkbox": { "equals": True } }
+                ]
+            },
+            "sorts": [{ "property": "Tên Romanji", "direction": "ascending" }]
+        }, priority=PRIORITY_INTERACTIVE, site="bench_series")
+    samples, elapsed, errors = await timed_many(call, len(names), concurrency)
+    row = summarize("series_notion", samples, elapsed)
+    row["errors"] = errors
+    row["unit"] = "truy vấn/s"
+    return row
+
+async def run_size(size, args):
+    rng = random.Random(args.seed)
+    pages = generate_catalog(size, seed=args.seed)
+    server = FakeNotion(pages, latency=args.latency, jitter=args.jitter,
+                        error_ratio=args.error_ratio, rps=args.rps, retry_after=args.retry_after)
+    base_url = await server.start()
+    client = TimedClient("bench-token", server.database_id, base_url=base_url,
+                         rate=args.rate, burst=args.burst, max_concurrency=args.concurrency,
+                         backoff_base=0.05, backoff_max=1.0)
+    rows = []
+    try:
+        catalog, row = await bench_full_sync(client)
+        rows.append(row)
+        if args.partitions > 1:
+            catalog, row = await bench_full_sync(client, args.partitions)
+            rows.append(row)
+        rows.append(await bench_poll(client, server, catalog, args.poll_rounds, args.poll_touched, rng))
+
+        queries = search_queries(pages, args.queries, rng)
+        rows.append(bench_local_search(catalog, queries))
+        rows.append(bench_local_text(catalog, text_queries(pages, args.queries, rng)))
+        series = sorted({ prop_value(p, "Loạt phim") for p in pages } - { "" })
+        names = [rng.choice(series) for _ in range(args.queries)] if series else []
+        rows.append(bench_local_series(catalog, names))
+        if not args.skip_live:
+            live = min(args.live_queries, len(queries))
+            rows.append(await bench_live_search(client, queries[:live], args.concurrency))
+            rows.append(await bench_live_series(client, names[:live], args.concurrency))
+    finally:
+        await client.close()
+        await server.stop()
+    for row in rows:
+        row["pages"] = size
+    return rows, server
+
+def print_table(size, rows, server):
+    print(f"\n📏 {size} trang — {server.requests} request tới Notion giả, {server.throttled} lần 429")
+    print(f"{'kịch bản':<18}{'số mẫu':>8}{'p50 (ms)':>12}{'p99 (ms)':>12}{'max (ms)':>12}{'thông lượng':>16}")
+    for row in rows:
+        print(
+            f"{row['name']:<18}{row['count']:>8}{row['p50_ms']:>12.2f}{row['p99_ms']:>12.2f}"
+            f"{row['max_ms']:>12.2f}{row['throughput']:>10.1f} {row['unit']}"
+            + (f" ({row['errors']} lỗi)" if row.get("errors") else "")
+        )
+
+async def main(args):
+    results = []
+    for size in args.pages:
+        rows, server = await run_size(size, args)
+        print_table(size, rows, server)
+        results.extend(rows)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"\n💾 Đã ghi kết quả vào {args.json}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark offline với server Notion giả")
+    parser.add_argument("--pages", type=lambda v: [int(x) for x in v.split(",")], default=[1000, 10000],
+                        help="Các cỡ catalog, cách nhau bởi dấu phẩy (vd 1000,10000,100000)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--latency", type=float, default=0.02, help="Độ trễ mỗi request của server giả (giây)")
+    parser.add_argument("--jitter", type=float, default=0.01)
+    parser.add_argument("--error-ratio", type=float, default=0.0, help="Tỉ lệ 429 ngẫu nhiên")
+    parser.add_argument("--rps", type=int, default=0, help="Giới hạn request/giây của server giả (0 = không)")
+    parser.add_argument("--retry-after", type=int, default=1)
+    parser.add_argument("--rate", type=float, default=100.0, help="Tốc độ bộ điều phối phía bot (request/giây)")
+    parser.add_argument("--burst", type=int, default=10)
+    parser.add_argument("--concurrency", type=int, default=3)
+    parser.add_argument("--partitions", type=int, default=4, help="Số phân vùng cho full sync song song (1 = tắt)")
+    parser.add_argument("--poll-rounds", type=int, default=20)
+    parser.add_argument("--poll-touched", type=int, default=5, help="Số trang bị sửa trước mỗi lượt kiểm tra")
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--live-queries", type=int, default=50)
+    parser.add_argument("--skip-live", action="store_true", help="Chỉ đo tra cứu trong bộ nhớ")
+    parser.add_argument("--json", help="Ghi kết quả ra file JSON để so sánh giữa các lần chạy")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,328 @@
+import asyncio
+import json
+import random
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from aiohttp import web
+
+# ==========================================
+# DỮ LIỆU GIẢ: SINH CATALOG GIỐNG DATABASE NOTION THẬT
+# ==========================================
+ROMAJI = [
+    "Kimetsu", "Shingeki", "Kyojin", "Yaiba", "Jujutsu", "Kaisen", "Boku", "Hero", "Akademia", "Koi",
+    "Sora", "Hikari", "Yume", "Tsuki", "Hoshi", "Kaze", "Mahou", "Shoujo", "Gakuen", "Monogatari",
+    "Sekai", "Tensei", "Isekai", "Maou", "Yuusha", "Kami", "Sama", "Ore", "Imouto", "Kanojo",
+    "Tonari", "Seishun", "Buta", "Yarou", "Hibike", "Euphonium", "Shiro", "Kuro", "Aoi", "Akai",
+]
+VIET = [
+    "Thanh", "Gươm", "Diệt", "Quỷ", "Đại", "Chiến", "Huyền", "Thoại", "Học", "Viện",
+    "Pháp", "Sư", "Cô", "Gái", "Mộng", "Mơ", "Người", "Khổng", "Lồ", "Hành",
+    "Trình", "Ngôi", "Sao", "Biển", "Lửa", "Băng", "Ánh", "Trăng", "Dũng", "Sĩ",
+    "Thế", "Giới", "Song", "Song", "Nhật", "Ký", "Chuyển", "Sinh", "Phù", "Thủy",
+]
+SEASONS = ["Mùa Đông", "Mùa Xuân", "Mùa Hạ", "Mùa Thu"]
+STATUSES = ["Đang tiến hành", "Hoàn thành", "Tạm ngưng"]
+GROUPS = ["Nhóm Sakura", "Muse VN", "Ani-One", "Nhóm Hoàng Hôn", "POPS"]
+SUMMARIES = [
+    "Một cậu thiếu niên bình thường bị cuốn vào cuộc chiến giữa con người và quỷ dữ, cùng đồng đội bảo vệ thế giới.",
+    "Cô gái bị mắc kẹt trong vòng lặp thời gian, phải sống lại một ngày cho tới khi cứu được người bạn thân.",
+    "Sau tai nạn, nhân vật chính chuyển sinh sang thế giới khác, trở thành pháp sư mạnh nhất vương quốc.",
+    "Câu lạc bộ bóng chuyền yếu nhất trường quyết tâm giành chức vô địch toàn quốc.",
+    "Chuyện tình học đường nhẹ nhàng giữa hai người bạn cùng lớp, đan xen những hiểu lầm dở khóc dở cười.",
+    "Thám tử trẻ phá giải những vụ án bí ẩn trong thành phố, mỗi manh mối dẫn tới một âm mưu lớn hơn.",
+    "Phi hành đoàn du hành giữa các vì sao, đối đầu với đế chế ngân hà và những bí mật của vũ trụ.",
+    "Cô bé phép thuật cùng linh thú nhỏ chiến đấu với thế lực bóng tối để bảo vệ thị trấn.",
+]
+
+def _text(kind, value):
+    if value is None:
+        return { "type": kind, kind: [] }
+    return { "type": kind, kind: [{ "type": "text", "plain_text": value, "text": { "content": value } }] }
+
+def _iso(ts):
+    # Notion làm tròn last_edited_time theo phút
+    return datetime.fromtimestamp(ts - ts % 60, timezone.utc).strftime("%Y-%m-%dT%H:%M:00.000Z")
+
+def make_page(page_id, title, english, year, season, series, created, edited, public=True, episodes=12, rng=random):
+    updated = datetime.fromtimestamp(edited, timezone(timedelta(hours=7))).isoformat(timespec="minutes")
+    return {
+        "object": "page",
+        "id": page_id,
+        "created_time": _iso(created),
+        "last_edited_time": _iso(edited),
+        "archived": False,
+        "properties": {
+            "Tên Romanji": _text("title", title),
+            "Tên tiếng Anh": _text("rich_text", english),
+            "Số tập Vietsub": { "type": "number", "number": episodes },
+            "Số tập": { "type": "number", "number": episodes },
+            "Năm": { "type": "select", "select": { "name": f"{season} {year}" } },
+            "Tải xuống phụ đề": { "type": "url", "url": f"https://example.com/sub/{page_id}" },
+            "Ảnh": { "type": "files", "files": [
+                { "type": "external", "name": "cover", "external": { "url": f"https://example.com/cover/{page_id}.jpg" } }
+            ]},
+            "Tóm tắt nội dung": _text("rich_text", rng.choice(SUMMARIES)),
+            "Trạng thái": { "type": "status", "status": { "name": rng.choice(STATUSES) } },
+            "Bản quyền/Nhóm dịch": { "type": "multi_select", "multi_select": [{ "name": rng.choice(GROUPS) }] },
+            "Loạt phim": _text("rich_text", series),
+            "Ngày cập nhật": { "type": "date", "date": { "start": updated } },
+            "Public": { "type": "checkbox", "checkbox": public },
+        },
+    }
+
+def generate_catalog(count, seed=0, series_ratio=0.3, hidden_ratio=0.05):
+    # Khoảng 30% phim thuộc 1 loạt (2-5 phần), 5% không Public
+    rng = random.Random(seed)
+    now = time.time()
+    pages = []
+    used = set()
+    while len(pages) < count:
+        words = rng.sample(ROMAJI, rng.randint(2, 3))
+        base = " ".join(words)
+        if base in used:
+            base = f"{base} {rng.randint(2, 999)}"
+        if base in used:
+            continue
+        used.add(base)
+        english = " ".join(rng.sample(VIET, rng.randint(2, 4)))
+        parts = rng.randint(2, 5) if rng.random() < series_ratio else 1
+        series = base if parts > 1 else None
+        year = rng.randint(2000, 2025)
+        for part in range(parts):
+            if len(pages) >= count: break
+            title = base if part == 0 else f"{base} Season {part + 1}"
+            created = now - rng.uniform(30, 3000) * 86400
+            edited = rng.uniform(created, now - 3600)
+            pages.append(make_page(
+                str(uuid.UUID(int=rng.getrandbits(128))), title,
+                english if part == 0 else f"{english} {part + 1}",
+                min(year + part, 2025), rng.choice(SEASONS), series,
+                created, edited,
+                public=rng.random() >= hidden_ratio,
+                episodes=rng.choice([12, 13, 24, 25]), rng=rng,
+            ))
+    return pages
+
+# ==========================================
+# BỘ LỌC / SẮP XẾP THEO CÚ PHÁP NOTION
+# ==========================================
+def prop_value(page, name):
+    prop = page["properties"].get(name)
+    if prop is None: return None
+    kind = prop["type"]
+    value = prop[kind]
+    if kind in ("title", "rich_text"):
+        return "".join(t["plain_text"] for t in value)
+    if kind in ("select", "status"):
+        return value["name"] if value else None
+    if kind == "multi_select":
+        return [o["name"] for o in value]
+    if kind == "date":
+        return value["start"] if value else None
+    return value
+
+def _compare(value, cond):
+    for op, expected in cond.items():
+        if op == "equals":
+            ok = value == expected
+        elif op == "does_not_equal":
+            ok = value != expected
+        elif op == "contains":
+            ok = value is not None and (expected in value if isinstance(value, list) else expected.casefold() in value.casefold())
+        elif op == "does_not_contain":
+            ok = value is None or expected.casefold() not in value.casefold()
+        elif op == "starts_with":
+            ok = value is not None and value.casefold().startswith(expected.casefold())
+        elif op == "is_empty":
+            ok = not value
+        elif op == "is_not_empty":
+            ok = bool(value)
+        elif op in ("after", "on_or_after", "before", "on_or_before"):
+            if not value: return False
+            left, right = value[:16], expected[:16]   # So đến phút, giống Notion
+            ok = {
+                "after": left > right, "on_or_after": left >= right,
+                "before": left < right, "on_or_before": left <= right,
+            }[op]
+        else:
+            raise ValueError(f"toán tử lọc không hỗ trợ: {op}")
+        if not ok: return False
+    return True
+
+def matches(page, flt):
+    if not flt: return True
+    if "and" in flt:
+        return all(matches(page, f) for f in flt["and"])
+    if "or" in flt:
+        return any(matches(page, f) for f in flt["or"])
+    if "timestamp" in flt:
+        kind = flt["timestamp"]
+        return _compare(page[kind], flt[kind])
+    value = prop_value(page, flt["property"])
+    cond = next(v for k, v in flt.items() if k != "property")
+    return _compare(value, cond)
+
+def sort_pages(pages, sorts):
+    for spec in reversed(sorts or []):
+        if "timestamp" in spec:
+            key = lambda p, k=spec["timestamp"]: p[k]
+        else:
+            key = lambda p, k=spec["property"]: prop_value(p, k) or ""
+        pages.sort(key=key, reverse=spec.get("direction") == "descending")
+    return pages
+
+# ==========================================
+# SERVER NOTION GIẢ (databases/{id}/query + pages/{id})
+# ==========================================
+class FakeNotion:
+    def __init__(self, pages, database_id="bench-db", latency=0.0, jitter=0.0,
+                 error_ratio=0.0, rps=0, retry_after=1):
+        self.database_id = database_id
+        self.pages = {p["id"]: p for p in pages}
+        self.order = [p["id"] for p in pages]   # Thứ tự mặc định: như lúc tạo
+        self.latency = latency                  # Độ trễ cố định mỗi request (giây)
+        self.jitter = jitter                    # Cộng thêm ngẫu nhiên 0..jitter
+        self.error_ratio = error_ratio          # Tỉ lệ trả 429 ngẫu nhiên
+        self.rps = rps                          # Giới hạn request/giây thật (0 = không giới hạn)
+        self.retry_after = retry_after
+        self.requests = 0
+        self.throttled = 0
+        self._window = []
+        self._version = 0
+        self._results = {}                      # (phiên bản, bộ lọc + sắp xếp) -> [page_id]
+        self._runner = None
+        self.base_url = None
+
+    # --- SỬA DỮ LIỆU TỪ BENCHMARK ---
+    def touch(self, page_ids, when=None):
+        # Giả lập người dùng sửa trang: đẩy last_edited_time + Ngày cập nhật lên hiện tại
+        when = when or time.time()
+        for page_id in page_ids:
+            old = self.pages[page_id]
+            fresh = make_page(
+                page_id, prop_value(old, "Tên Romanji"), prop_value(old, "Tên tiếng Anh"),
+                *prop_value(old, "Năm").rsplit(" ", 1)[::-1], prop_value(old, "Loạt phim") or None,
+                datetime.fromisoformat(old["created_time"].replace("Z", "+00:00")).timestamp(), when,
+                public=prop_value(old, "Public"), episodes=prop_value(old, "Số tập"),
+            )
+            self.pages[page_id] = fresh
+        self._version += 1
+
+    def add(self, pages):
+        for page in pages:
+            self.pages[page["id"]] = page
+            self.order.append(page["id"])
+        self._version += 1
+
+    # --- XỬ LÝ REQUEST ---
+    def _throttle(self):
+        if self.error_ratio and random.random() < self.error_ratio:
+            return True
+        if not self.rps: return False
+        now = time.monotonic()
+        self._window = [t for t in self._window if now - t < 1.0]
+        if len(self._window) >= self.rps:
+            return True
+        self._window.append(now)
+        return False
+
+    async def _gate(self):
+        self.requests += 1
+        delay = self.latency + (random.uniform(0, self.jitter) if self.jitter else 0)
+        if delay:
+            await asyncio.sleep(delay)
+        if self._throttle():
+            self.throttled += 1
+            return web.json_response(
+                { "object": "error", "status": 429, "code": "rate_limited", "message": "Rate limited" },
+                status=429, headers={ "Retry-After": str(self.retry_after) },
+            )
+        return None
+
+    def _matching(self, payload):
+        key = (self._version, json.dumps([payload.get("filter"), payload.get("sorts")], sort_keys=True))
+        ids = self._results.get(key)
+        if ids is None:
+            pages = [self.pages[i] for i in self.order if matches(self.pages[i], payload.get("filter"))]
+            ids = [p["id"] for p in sort_pages(pages, payload.get("sorts"))]
+            if len(self._results) > 64:
+                self._results.clear()
+            self._results[key] = ids
+        return ids
+
+    async def handle_query(self, request):
+        if request.match_info["database_id"] != self.database_id:
+            return web.json_response({ "object": "error", "status": 404, "message": "Không có database" }, status=404)
+        throttled = await self._gate()
+        if throttled is not None: return throttled
+        payload = await request.json() if request.can_read_body else {}
+        try:
+            ids = self._matching(payload)
+        except (KeyError, ValueError, StopIteration) as e:
+            return web.json_response({ "object": "error", "status": 400, "message": str(e) }, status=400)
+
+        # Cursor = vị trí tiếp theo, kèm phiên bản để giống cursor "mờ" của Notion
+        start = 0
+        cursor = payload.get("start_cursor")
+        if cursor:
+            start = int(cursor.split(":")[1])
+        size = min(int(payload.get("page_size", 100)), 100)
+        chunk = ids[start:start + size]
+        has_more = start + size < len(ids)
+        return web.json_response({
+            "object": "list",
+            "results": [self.pages[i] for i in chunk],
+            "has_more": has_more,
+            "next_cursor": f"{self._version}:{start + size}" if has_more else None,
+        })
+
+    async def handle_page(self, request):
+        throttled = await self._gate()
+        if throttled is not None: return throttled
+        page = self.pages.get(request.match_info["page_id"])
+        if page is None:
+            return web.json_response({ "object": "error", "status": 404, "message": "Không có trang" }, status=404)
+        return web.json_response(page)
+
+    async def start(self, host="127.0.0.1", port=0):
+        app = web.Application()
+        app.router.add_post("/v1/databases/{database_id}/query", self.handle_query)
+        app.router.add_get("/v1/pages/{page_id}", self.handle_page)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.base_url = f"http://{host}:{port}/v1"
+        return self.base_url
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+# Chạy riêng để trỏ bot vào: NOTION_API_URL=http://127.0.0.1:8787/v1 NOTION_DATABASE_ID=bench-db
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Server Notion giả cho benchmark")
+    parser.add_argument("--pages", type=int, default=2000)
+    parser.add_argument("--port", type=int, default=8787)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--error-ratio", type=float, default=0.0)
+    parser.add_argument("--rps", type=int, default=0)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    async def serve():
+        server = FakeNotion(generate_catalog(args.pages, seed=args.seed), latency=args.latency,
+                            jitter=args.jitter, error_ratio=args.error_ratio, rps=args.rps)
+        url = await server.start(port=args.port)
+        print(f"🧪 Notion giả: {url} (database {server.database_id}, {len(server.pages)} trang)")
+        await asyncio.Event().wait()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
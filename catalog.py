@@ -0,0 +1,357 @@
+import bisect
+import os
+import pickle
+import random
+from collections import OrderedDict, deque
+from records import AnimeRecord
+from search_index import TitleIndex, PrefixIndex, SeasonIndex, TextIndex, normalize_title
+
+PUBLIC_FILTER = { "filter": { "property": "Public", "checkbox": { "equals": True } } }
+
+# Tăng khi đổi cấu trúc AnimeRecord: snapshot cũ sẽ bị bỏ qua
+SNAPSHOT_VERSION = 5
+# Trạng thái chuyển sang catalog khác khi nạp snapshot (index dựng ở thread riêng)
+STATE_FIELDS = (
+    "records", "watermark", "title_index", "season_index", "prefix_index", "text_index",
+    "series", "_series_of", "_ids", "_id_pos",
+)
+
+# ==========================================
+# CATALOG: BẢN SAO CỤC BỘ CỦA DATABASE PUBLIC
+# ==========================================
+class Catalog:
+    def __init__(self, full_reload_every=36):
+        self.records = {}        # page_id -> AnimeRecord
+        self.watermark = None    # last_edited_time lớn nhất đã thấy (ISO, UTC)
+        self.ready = False
+        self.title_index = TitleIndex()
+        self.season_index = SeasonIndex()
+        self.prefix_index = PrefixIndex()
+        self.text_index = TextIndex()
+        self.series = {}         # "Loạt phim" -> [(Tên Romanji, page_id)] đã sắp xếp
+        self._series_of = {}     # page_id -> (Loạt phim, Tên Romanji)
+        self._ids = []           # Danh sách page_id để bốc ngẫu nhiên O(1)
+        self._id_pos = {}        # page_id -> vị trí trong _ids
+        # Delta sync không thấy trang bị xoá/lưu trữ -> thỉnh thoảng tải lại toàn bộ
+        self.full_reload_every = full_reload_every
+        self._refresh_count = 0
+        self.revision = 0        # Tăng mỗi lần catalog đổi (kể cả URL ảnh) -> biết khi nào cần ghi snapshot
+
+    def __len__(self):
+        return len(self.records)
+
+    def apply(self, records, advance_watermark=True):
+        # Cập nhật catalog từ danh sách AnimeRecord; trả về các bản ghi đã thay đổi.
+        # Kết quả đã lọc (lượt kiểm tra chỉ lấy Public, get_page từng trang) truyền advance_watermark=False:
+        # watermark chỉ được tiến theo các lượt quét không lọc, nếu không refresh sẽ bỏ sót trang bị ẩn trước đó
+        changed = []
+        for anime in records:
+            page_id = anime.page_id
+            last_edited = anime.last_edited
+            if advance_watermark and last_edited and (self.watermark is None or last_edited > self.watermark):
+                self.watermark = last_edited
+
+            if not anime.public:
+                if self.records.pop(page_id, None) is not None:
+                    self._unindex(page_id)
+                    changed.append(anime)
+                continue
+
+            old = self.records.get(page_id)
+            # Lô đến muộn từ lần tải toàn bộ không được đè bản mới hơn do lượt kiểm tra đã áp
+            if old is not None and last_edited and old.last_edited and last_edited < old.last_edited:
+                continue
+            if old is None or old.last_edited != last_edited:
+                self.records[page_id] = anime
+                self._index(anime)
+                changed.append(anime)
+            elif anime.anh_bia != old.anh_bia:
+                # Notion ký lại URL ảnh ở mỗi lần truy vấn: lấy URL mới, không cần index lại
+                old.anh_bia = anime.anh_bia
+                old.anh_bia_expires = anime.anh_bia_expires
+                self.revision += 1
+        if changed:
+            self.revision += 1
+        return changed
+
+    def apply_pages(self, pages, advance_watermark=True):
+        return self.apply([AnimeRecord.from_page(p) for p in pages], advance_watermark)
+
+    def discard(self, page_ids):
+        # Trang đã bị xoá hẳn (Notion trả 404): bỏ khỏi catalog, trả về các bản ghi đã bỏ
+        removed = []
+        for page_id in page_ids:
+            anime = self.records.pop(page_id, None)
+            if anime is None: continue
+            self._unindex(page_id)
+            removed.append(anime)
+        if removed:
+            self.revision += 1
+        return removed
+
+    # --- CẬP NHẬT INDEX THEO TỪNG BẢN GHI ---
+    def _index(self, anime, defer=False):
+        page_id = anime.page_id
+        if page_id not in self._id_pos:
+            self._id_pos[page_id] = len(self._ids)
+            self._ids.append(page_id)
+        ten_romanji = anime.ten_romanji
+        self.title_index.add(page_id, (ten_romanji, anime.ten_tieng_anh), defer=defer)
+        self.prefix_index.add(page_id, (ten_romanji, anime.ten_tieng_anh), defer=defer)
+        self.season_index.add(page_id, anime.nam, ten_romanji, defer=defer)
+        self.text_index.add(page_id, (
+            (ten_romanji, 3), (anime.ten_tieng_anh, 3), (anime.loat_phim, 2),
+            (anime.nhom_dich, 2), (anime.tom_tat, 1),
+        ))
+
+        self._unindex_series(page_id)
+        series_name = anime.loat_phim
+        if series_name not in ["Không có", "N/A", None]:
+            bisect.insort(self.series.setdefault(series_name, []), (ten_romanji, page_id))
+            self._series_of[page_id] = (series_name, ten_romanji)
+
+    def _unindex(self, page_id):
+        # Đổi chỗ với phần tử cuối rồi pop: xoá O(1)
+        pos = self._id_pos.pop(page_id, None)
+        if pos is not None:
+            last = self._ids.pop()
+            if last != page_id:
+                self._ids[pos] = last
+                self._id_pos[last] = pos
+        self.title_index.remove(page_id)
+        self.prefix_index.remove(page_id)
+        self.season_index.remove(page_id)
+        self.text_index.remove(page_id)
+        self._unindex_series(page_id)
+
+    def _unindex_series(self, page_id):
+        entry = self._series_of.pop(page_id, None)
+        if entry is None: return
+        series_name, ten_romanji = entry
+        members = self.series.get(series_name, [])
+        i = bisect.bisect_left(members, (ten_romanji, page_id))
+        if i < len(members) and members[i] == (ten_romanji, page_id):
+            del members[i]
+        if not members:
+            self.series.pop(series_name, None)
+
+    async def load(self, stream_all):
+        # stream_all(filter, partitioned) -> async iterator các lô trang Notion.
+        # Áp từng lô ngay khi về: lần đầu catalog đầy dần, lần tải lại vẫn phục vụ bản cũ trong lúc tải.
+        before = self.watermark
+        seen = set()
+        async for pages in stream_all(PUBLIC_FILTER, partitioned=True):
+            self.apply_pages(pages)
+            seen.update(p["id"] for p in pages)
+
+        # Trang không còn trong kết quả (bị xoá/ẩn) -> bỏ; trang mới thêm trong lúc tải thì giữ
+        for page_id in [i for i, a in self.records.items() if i not in seen]:
+            if before is None or (self.records[page_id].last_edited or "") <= before:
+                del self.records[page_id]
+                self._unindex(page_id)
+                self.revision += 1
+        self.ready = True
+        self._refresh_count = 0
+        print(f"📚 Đã tải catalog: {len(self.records)} phim.")
+        return self.all_records()
+
+    async def refresh(self, stream_all):
+        # Chỉ lấy các trang sửa sau watermark (không lọc Public để bắt được trang bị ẩn)
+        if not self.ready or self.watermark is None:
+            return await self.load(stream_all)
+        self._refresh_count += 1
+        if self.full_reload_every and self._refresh_count >= self.full_reload_every:
+            return await self.load(stream_all)
+
+        delta_filter = {
+            "filter": {
+                "timestamp": "last_edited_time",
+                "last_edited_time": { "on_or_after": self.watermark }
+            }
+        }
+        changed = []
+        async for pages in stream_all(delta_filter, partitioned=False):
+            changed.extend(self.apply_pages(pages))
+        if changed:
+            print(f"🔄 Catalog: {len(changed)} phim thay đổi.")
+        return changed
+
+    # --- TRA CỨU TRONG BỘ NHỚ ---
+    def sorted_by_title(self, records):
+        return sorted(records, key=lambda a: a.ten_romanji)
+
+    def search_titles(self, keyword, limit=25):
+        # Không phân biệt hoa/thường, dấu; chịu được lỗi gõ nhỏ; xếp theo độ khớp.
+        # Từ khoá 1-2 ký tự không đủ trigram -> tìm theo đầu từ trong PrefixIndex
+        if len(normalize_title(keyword)) < 3:
+            page_ids = self.prefix_index.search(keyword, limit)
+        else:
+            page_ids = self.title_index.search(keyword, limit)
+        return [self.records[pid] for pid in page_ids]
+
+    def search_text(self, query, limit=25):
+        # Tìm theo nội dung (tóm tắt, tên, loạt phim, nhóm dịch), xếp hạng BM25
+        return [self.records[pid] for pid, _ in self.text_index.search(query, limit)]
+
+    def suggest_titles(self, prefix, limit=25):
+        # Gợi ý theo tiền tố; không có thì dùng tìm gần đúng
+        page_ids = self.prefix_index.search(prefix, limit)
+        if not page_ids:
+            page_ids = self.title_index.search(prefix, limit)
+        return [self.records[pid] for pid in page_ids]
+
+    def series_members(self, series_name, exclude_id=None):
+        # [(page_id, Tên Romanji)] theo thứ tự tên, bỏ phim đang xem
+        return [(pid, name) for name, pid in self.series.get(series_name, []) if pid != exclude_id]
+
+    def search_season(self, ten_mua):
+        # Trả về (nhãn, LazyRecords); từ khoá lạ thì dò chuỗi trên "Năm" như Notion
+        found = self.season_index.query(ten_mua)
+        if found is not None:
+            label, page_ids = found
+            return label, LazyRecords(self, page_ids)
+        kw = ten_mua.lower()
+        matches = [a for a in self.records.values() if kw in str(a.nam).lower()]
+        return ten_mua, LazyRecords(self, [a.page_id for a in self.sorted_by_title(matches)])
+
+    def random_record(self, exclude=(), attempts=8):
+        # Chọn đều trên toàn bộ catalog; tránh các phim trong exclude nếu được
+        if not self._ids: return None
+        for _ in range(attempts):
+            page_id = random.choice(self._ids)
+            if page_id not in exclude:
+                return self.records[page_id]
+        candidates = [pid for pid in self._ids if pid not in exclude] if len(exclude) < len(self._ids) else self._ids
+        return self.records[random.choice(candidates)]
+
+    def all_records(self):
+        return list(self.records.values())
+
+    # --- SNAPSHOT: CHỈ LƯU BẢN GHI + WATERMARK, INDEX DỰNG LẠI KHI NẠP ---
+    def snapshot_state(self):
+        # Chạy trong event loop: chụp bản ghi thành tuple (bất biến) rồi tuần tự hoá ở thread khác
+        return self.watermark, [anime.to_tuple() for anime in self.records.values()]
+
+    def rebuild(self, records, watermark):
+        # Dựng catalog mới từ đầu (chưa ai đọc nên chạy được ở thread riêng);
+        # index tiền tố/mùa nối vào cuối rồi sắp xếp 1 lần thay vì insort từng phim
+        for anime in records:
+            self.records[anime.page_id] = anime
+            self._index(anime, defer=True)
+        self.title_index.finish()
+        self.prefix_index.finish()
+        self.season_index.finish()
+        self.watermark = watermark
+        self.ready = True
+        return self
+
+    def adopt(self, other):
+        # Nhận toàn bộ trạng thái của catalog đã dựng xong (trong event loop, không có await giữa chừng)
+        for name in STATE_FIELDS:
+            setattr(self, name, getattr(other, name))
+        self.ready = True
+        self._refresh_count = 0
+        self.revision += 1
+
+    def merge(self, records, watermark):
+        # Follower nạp snapshot mới của leader: chỉ index lại các phim đổi, bỏ phim không còn
+        changed = self.apply(records)
+        keep = { anime.page_id for anime in records }
+        for page_id in [i for i in self.records if i not in keep]:
+            changed.append(self.records.pop(page_id))
+            self._unindex(page_id)
+            self.revision += 1
+        if watermark and (self.watermark is None or watermark > self.watermark):
+            self.watermark = watermark
+        self.ready = True
+        return changed
+
+# ==========================================
+# FILE SNAPSHOT CATALOG
+# ==========================================
+def read_snapshot(path):
+    try:
+        with open(path, "rb") as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+    except OSError as e:
+        print(f"⚠️ Không đọc được snapshot {path}: {e}")
+        return None
+
+def encode_snapshot(state):
+    # Chạy ở thread riêng: state là bản chụp từ snapshot_state(), không còn dính tới catalog
+    watermark, rows = state
+    return pickle.dumps(
+        { "version": SNAPSHOT_VERSION, "watermark": watermark, "records": rows },
+        protocol=pickle.HIGHEST_PROTOCOL,
+    )
+
+def decode_snapshot(data):
+    # Trả về (watermark, [AnimeRecord]) hoặc None nếu hỏng / khác phiên bản
+    try:
+        state = pickle.loads(data)
+    except Exception as e:
+        print(f"⚠️ Snapshot catalog hỏng, bỏ qua: {e}")
+        return None
+    if not isinstance(state, dict) or state.get("version") != SNAPSHOT_VERSION:
+        print("⚠️ Snapshot catalog khác phiên bản, bỏ qua.")
+        return None
+    return state["watermark"], [AnimeRecord.from_tuple(row) for row in state["records"]]
+
+def write_snapshot(path, data):
+    # Ghi ra file tạm rồi đổi tên: tắt máy giữa chừng cũng không để lại snapshot dở
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+# ==========================================
+# DANH SÁCH KẾT QUẢ "LƯỜI": CHỈ GIỮ page_id, LẤY BẢN GHI KHI HIỂN THỊ
+# ==========================================
+class LazyRecords:
+    __slots__ = ("catalog", "page_ids")
+
+    def __init__(self, catalog, page_ids):
+        self.catalog = catalog
+        self.page_ids = page_ids
+
+    def __len__(self):
+        return len(self.page_ids)
+
+    def __bool__(self):
+        return bool(self.page_ids)
+
+    def __getitem__(self, i):
+        # Phim bị gỡ khỏi catalog sau khi tìm -> None
+        return self.catalog.records.get(self.page_ids[i])
+
+# ==========================================
+# CỬA SỔ "KHÔNG LẶP LẠI" CHO LỆNH NGẪU NHIÊN
+# ==========================================
+class RecentWindow:
+    def __init__(self, size=20, max_keys=10000):
+        self.size = size
+        self.max_keys = max_keys
+        self._recent = OrderedDict()    # user/kênh -> (deque page_id, set page_id)
+
+    def get(self, key):
+        entry = self._recent.get(key)
+        return entry[1] if entry else set()
+
+    def add(self, key, page_id):
+        if self.size <= 0: return
+        entry = self._recent.get(key)
+        if entry is None:
+            entry = (deque(), set())
+            self._recent[key] = entry
+        self._recent.move_to_end(key)
+        order, seen = entry
+        order.append(page_id)
+        seen.add(page_id)
+        if len(order) > self.size:
+            seen.discard(order.popleft())
+        while len(self._recent) > self.max_keys:
+            self._recent.popitem(last=False)
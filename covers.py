@@ -0,0 +1,131 @@
+import asyncio
+import hashlib
+import os
+import time
+import aiohttp
+
+# Đuôi file theo Content-Type ảnh bìa
+IMAGE_TYPES = {
+    "image/jpeg": ".jpg", "image/png": ".png", "image/webp": ".webp", "image/gif": ".gif",
+}
+
+def source_key(url):
+    # URL ký của Notion đổi query string mỗi lần truy vấn nhưng đường dẫn file thì giữ nguyên
+    return url.split("?", 1)[0]
+
+def has_cover(anime):
+    return bool(anime.anh_bia) and anime.anh_bia != "N/A"
+
+# ==========================================
+# ẢNH BÌA: THEO DÕI HẠN URL KÝ + SAO LƯU TUỲ CHỌN
+# ==========================================
+class CoverCache:
+    def __init__(self, margin=900, mirror_dir=None, public_url=None, store=None,
+                 max_bytes=5 * 1024 * 1024, concurrency=4, batch=50):
+        self.margin = margin                    # Làm mới trước khi hết hạn bao nhiêu giây
+        # Chỉ sao lưu khi có cả thư mục lẫn URL công khai (Discord phải tải được ảnh)
+        self.mirror_dir = mirror_dir if mirror_dir and public_url else None
+        self.public_url = public_url.rstrip("/") if public_url else None
+        self.store = store
+        self.max_bytes = max_bytes
+        self.concurrency = concurrency
+        self.batch = batch                      # Số ảnh tải tối đa mỗi lượt
+        self._mirrored = {}                     # page_id -> (nguồn, tên file)
+        self._wanted = {}                       # page_id -> URL cần sao lưu
+        self._session = None
+        self.reload()
+
+    def reload(self):
+        if self.mirror_dir and self.store is not None:
+            self._mirrored = self.store.load_covers()
+
+    def url_for(self, anime):
+        # URL ảnh dùng được ngay để gắn vào embed (không gọi Notion)
+        if not has_cover(anime): return None
+        url = anime.anh_bia
+        if self.mirror_dir:
+            mirrored = self._mirrored.get(anime.page_id)
+            if mirrored and mirrored[0] == source_key(url):
+                return f"{self.public_url}/{mirrored[1]}"
+            self._wanted[anime.page_id] = url
+        return url
+
+    def expiring(self, records, now=None):
+        # page_id có URL ký sắp hết hạn (hoặc đã hết) trong khoảng margin tới
+        deadline = (now or time.time()) + self.margin
+        return [
+            anime.page_id for anime in records
+            if anime.anh_bia_expires is not None and anime.anh_bia_expires <= deadline
+            and not self.is_mirrored(anime)
+        ]
+
+    def is_mirrored(self, anime):
+        # Đã có bản sao cùng nguồn -> embed dùng bản sao, URL ký hết hạn cũng không sao
+        mirrored = self._mirrored.get(anime.page_id)
+        return mirrored is not None and has_cover(anime) and mirrored[0] == source_key(anime.anh_bia)
+
+    def queue_mirror(self, records):
+        if not self.mirror_dir: return
+        for anime in records:
+            if has_cover(anime) and not self.is_mirrored(anime):
+                self._wanted[anime.page_id] = anime.anh_bia
+
+    # --- SAO LƯU ẢNH VỀ THƯ MỤC TĨNH (tên file = hash nội dung) ---
+    async def mirror_pending(self):
+        if not self.mirror_dir or not self._wanted: return 0
+        if self._session is None or self._session.closed:
+            # Session riêng, không mang header Authorization của Notion sang S3/host ảnh
+            self._session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=30))
+        os.makedirs(self.mirror_dir, exist_ok=True)
+        items = list(self._wanted.items())[:self.batch]
+        sem = asyncio.Semaphore(self.concurrency)
+
+        async def one(page_id, url):
+            async with sem:
+                try:
+                    name = await self._download(url)
+                except (aiohttp.ClientError, asyncio.TimeoutError, OSError, ValueError) as e:
+                    print(f"⚠️ Không sao lưu được ảnh bìa {page_id}: {e}")
+                    name = None
+            # URL đổi trong lúc tải -> để lượt sau làm lại với URL mới
+            if self._wanted.get(page_id) == url:
+                del self._wanted[page_id]
+            if name is None: return False
+            self._mirrored[page_id] = (source_key(url), name)
+            if self.store is not None:
+                self.store.set_cover(page_id, source_key(url), name)
+            return True
+
+        results = await asyncio.gather(*(one(page_id, url) for page_id, url in items))
+        done = sum(results)
+        if done:
+            print(f"🖼️ Đã sao lưu {done} ảnh bìa.")
+        return done
+
+    async def _download(self, url):
+        async with self._session.get(url) as resp:
+            resp.raise_for_status()
+            ext = IMAGE_TYPES.get(resp.content_type)
+            if ext is None:
+                raise ValueError(f"không phải ảnh ({resp.content_type})")
+            data = bytearray()
+            async for chunk in resp.content.iter_chunked(64 * 1024):
+                data.extend(chunk)
+                if len(data) > self.max_bytes:
+                    raise ValueError("ảnh quá lớn")
+        name = hashlib.sha256(data).hexdigest()[:32] + ext
+        path = os.path.join(self.mirror_dir, name)
+        if not os.path.exists(path):
+            await asyncio.to_thread(_write_file, path, bytes(data))
+        return name
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+def _write_file(path, data):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
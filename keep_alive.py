@@ -1,18 +1,44 @@
 import os
-from flask import Flask
-from threading import Thread
+import json
+from aiohttp import web
+from metrics import REGISTRY
 
-app = Flask('')
+# ==========================================
+# WEB SERVER (Chạy chung event loop với bot, để Render ping + xem metrics)
+# ==========================================
+async def home(request):
+    return web.Response(text="Đang hoạt động...")
 
-@app.route('/')
-def home():
-    return "Đang hoạt động..."
+async def metrics(request):
+    return web.Response(text=REGISTRY.render(), content_type="text/plain", charset="utf-8")
 
-def run():
-    # Quan trọng: Render cấp PORT nào thì dùng PORT đó, nếu không có mới dùng 8080
-    port = int(os.environ.get("PORT", 8080))
-    app.run(host='0.0.0.0', port=port)
+async def keep_alive(health_check, port, covers_dir=None):
+    # health_check() -> (ok, dict thông tin); covers_dir: thư mục ảnh bìa đã sao lưu (tuỳ chọn)
+    async def healthz(request):
+        ok, info = health_check()
+        return web.Response(
+            text=json.dumps(info, ensure_ascii=False), status=200 if ok else 503,
+            content_type="application/json", charset="utf-8",
+        )
 
-def keep_alive():
-    t = Thread(target=run)
-    t.start()
+    app = web.Application()
+    app.router.add_get("/", home)
+    app.router.add_get("/healthz", healthz)
+    app.router.add_get("/metrics", metrics)
+    if covers_dir:
+        os.makedirs(covers_dir, exist_ok=True)
+        # Tên file là hash nội dung: cùng URL luôn là cùng một ảnh
+        app.router.add_static("/covers", covers_dir)
+
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    # Quan trọng: Render cấp PORT nào thì dùng PORT đó (main.py đọc biến PORT, mặc định 8080)
+    try:
+        await web.TCPSite(runner, "0.0.0.0", port).start()
+    except OSError as e:
+        # Tiến trình khác trên cùng máy đã giữ cổng này -> chạy tiếp không có web server
+        print(f"⚠️ Không mở được web server ở cổng {port}: {e}. Đặt PORT riêng cho tiến trình này (hoặc PORT=off).")
+        await runner.cleanup()
+        return None
+    print(f"🌐 Web server chạy ở cổng {port} (/healthz, /metrics)")
+    return runner
@@ -1,17 +1,31 @@
 import os
+import asyncio
+import hashlib
+import json
+import math
+import time
 import discord
-import aiohttp 
 import random
 import re
-import json
-import unicodedata
-from datetime import datetime, timedelta, timezone 
+import socket
+import traceback
 from discord import app_commands
 from discord.ext import tasks
 from discord.ui import View, Button, Select
+from notion_api import NOTION_API_URL, NotionClient, NotionError, RequestScheduler, get_prop, PRIORITY_POLL, PRIORITY_SYNC
+from catalog import (
+    Catalog, LazyRecords, RecentWindow, PUBLIC_FILTER,
+    read_snapshot, write_snapshot, encode_snapshot, decode_snapshot,
+)
+from search_index import fold_ascii
+from query_cache import QueryCache, RenderCache
+from store import NotifyStore
+from covers import CoverCache
+from records import AnimeRecord
 
 # --- IMPORT FILE KEEP_ALIVE (Để chạy trên Render) ---
-from keep_alive import keep_alive 
+from keep_alive import keep_alive
+from metrics import REGISTRY, Gauge, COMMAND_LATENCY, POLL_DURATION, POLL_PAGES, POLL_LAST_PAGES, stage, traced, untraced
 
 # --- CẤU HÌNH (Lấy từ Environment Variables) ---
 TOKEN = os.getenv('DISCORD_TOKEN')
@@ -20,7 +34,84 @@ DATABASE_ID = os.getenv('NOTION_DATABASE_ID')
 CHANNEL_ID = os.getenv('CHANNEL_ID')
 
 WEB_BASE_URL = "https://rmbd.onrender.com" 
+STATE_DB = os.getenv('STATE_DB', 'bot_state.db')
+# File JSON cũ, chỉ còn dùng để chuyển dữ liệu sang SQLite
 CACHE_FILE = "cache.json"
+POLL_STATE_FILE = "poll_state.json"
+
+# --- CẤU HÌNH KIỂM TRA PHIM MỚI ---
+# "delta": chỉ lấy trang sửa sau lần quét trước | "full": quét toàn bộ như cũ
+POLL_MODE = os.getenv('POLL_MODE', 'delta')
+POLL_INTERVAL_MINUTES = float(os.getenv('POLL_INTERVAL_MINUTES', 10))
+
+# --- CẤU HÌNH GỬI THÔNG BÁO ---
+NOTIFY_WORKERS = int(os.getenv('NOTIFY_WORKERS', 3))
+# Discord cho mỗi kênh khoảng 5 tin / 5 giây
+NOTIFY_RATE = float(os.getenv('NOTIFY_RATE', 1))
+NOTIFY_BURST = int(os.getenv('NOTIFY_BURST', 5))
+# > 0: đợt nào nhiều hơn ngưỡng này thì gom thành tin tổng hợp
+NOTIFY_DIGEST_THRESHOLD = int(os.getenv('NOTIFY_DIGEST_THRESHOLD', 0))
+
+# --- CẤU HÌNH KẾT NỐI NOTION (Pool dùng chung) ---
+# Đổi sang server Notion giả (bench/fake_notion.py) khi thử nghiệm offline
+NOTION_BASE_URL = os.getenv('NOTION_API_URL', NOTION_API_URL)
+NOTION_POOL_LIMIT = int(os.getenv('NOTION_POOL_LIMIT', 10))
+NOTION_TIMEOUT = float(os.getenv('NOTION_TIMEOUT', 30))
+NOTION_CONNECT_TIMEOUT = float(os.getenv('NOTION_CONNECT_TIMEOUT', 10))
+NOTION_KEEPALIVE = float(os.getenv('NOTION_KEEPALIVE', 60))
+# Notion cho phép trung bình 3 request/giây mỗi integration
+NOTION_RATE = float(os.getenv('NOTION_RATE', 3))
+NOTION_BURST = int(os.getenv('NOTION_BURST', 3))
+NOTION_CONCURRENCY = int(os.getenv('NOTION_CONCURRENCY', 3))
+NOTION_MAX_RETRIES = int(os.getenv('NOTION_MAX_RETRIES', 5))
+
+# Lệnh chạy lâu hơn ngưỡng này (giây) sẽ được in chi tiết từng giai đoạn
+SLOW_COMMAND_SECONDS = float(os.getenv('SLOW_COMMAND_SECONDS', 2))
+
+# --- CẤU HÌNH CATALOG (Bản sao trong bộ nhớ) ---
+CATALOG_REFRESH_MINUTES = float(os.getenv('CATALOG_REFRESH_MINUTES', 5))
+CATALOG_LIVE_FALLBACK = os.getenv('CATALOG_LIVE_FALLBACK', '0') == '1'
+# Số phân vùng created_time tải song song khi đồng bộ toàn bộ (1 = duyệt cursor tuần tự như cũ)
+SYNC_PARTITIONS = int(os.getenv('SYNC_PARTITIONS', 4))
+# Snapshot bản ghi catalog trên đĩa để khởi động nhanh (để trống = tắt)
+CATALOG_SNAPSHOT = os.getenv('CATALOG_SNAPSHOT', 'catalog_snapshot.pkl')
+# Khoảng cách tối thiểu giữa 2 lần ghi snapshot (giây); thay đổi trong lúc chờ được ghi ở lượt sau
+SNAPSHOT_MIN_SECONDS = float(os.getenv('SNAPSHOT_MIN_SECONDS', 300))
+# --- CẤU HÌNH ẢNH BÌA (URL ký của Notion hết hạn sau ~1 giờ) ---
+COVER_REFRESH_MINUTES = float(os.getenv('COVER_REFRESH_MINUTES', 10))
+# Làm mới các URL sẽ hết hạn trong khoảng này (giây); nên lớn hơn chu kỳ làm mới
+COVER_REFRESH_MARGIN = float(os.getenv('COVER_REFRESH_MARGIN', 1200))
+# Sao lưu ảnh về thư mục, phục vụ qua web server: vd COVER_PUBLIC_URL=https://<app>.onrender.com/covers
+COVER_MIRROR_DIR = os.getenv('COVER_MIRROR_DIR', '')
+COVER_PUBLIC_URL = os.getenv('COVER_PUBLIC_URL', '')
+
+# Danh sách kết quả gắn với nút /tim, /mua được giữ bao nhiêu ngày
+RESULT_SET_DAYS = float(os.getenv('RESULT_SET_DAYS', 30))
+
+# --- CẤU HÌNH SHARD & CHẠY NHIỀU TIẾN TRÌNH ---
+# SHARD_COUNT: trống = 1 kết nối như cũ; "auto" = Discord tự chọn số shard; số = tổng số shard
+SHARD_COUNT = os.getenv('SHARD_COUNT', '').strip().lower()
+# SHARD_IDS: các shard do tiến trình này chạy, vd "0,1" (cần SHARD_COUNT là số)
+SHARD_IDS = [int(x) for x in os.getenv('SHARD_IDS', '').split(',') if x.strip()]
+# Các tiến trình dùng chung STATE_DB + CATALOG_SNAPSHOT; lease quyết định ai là leader
+LEADER_LEASE_SECONDS = float(os.getenv('LEADER_LEASE_SECONDS', 30))
+INSTANCE_ID = os.getenv('INSTANCE_ID') or f"{socket.gethostname()}:{os.getpid()}"
+# Cổng web server (/healthz, /metrics, /covers). Nhiều tiến trình trên cùng máy: mỗi tiến trình
+# một PORT riêng, hoặc PORT=off để tắt; trùng cổng thì chỉ cảnh báo, bot vẫn chạy không có web server
+WEB_PORT = os.getenv('PORT', '8080').strip().lower()
+
+# --- CẤU HÌNH ĐỒNG BỘ LỆNH SLASH ---
+# Chỉ gọi tree.sync() khi định nghĩa lệnh đổi; đặt 1 để luôn đồng bộ
+FORCE_COMMAND_SYNC = os.getenv('FORCE_COMMAND_SYNC', '0') == '1'
+
+# --- CẤU HÌNH CACHE TRUY VẤN NOTION ---
+QUERY_CACHE_TTL = float(os.getenv('QUERY_CACHE_TTL', 60))
+QUERY_CACHE_SIZE = int(os.getenv('QUERY_CACHE_SIZE', 256))
+EMBED_CACHE_SIZE = int(os.getenv('EMBED_CACHE_SIZE', 512))
+
+# --- CẤU HÌNH /ngaunhien: không lặp lại N phim gần nhất theo user hoặc kênh ---
+RANDOM_NO_REPEAT = int(os.getenv('RANDOM_NO_REPEAT', 0))
+RANDOM_NO_REPEAT_SCOPE = os.getenv('RANDOM_NO_REPEAT_SCOPE', 'user')
 
 intents = discord.Intents.default()
 intents.message_content = True 
@@ -28,161 +119,200 @@ intents.message_content = True
 # ==========================================
 # PHẦN 1: QUẢN LÝ CACHE
 # ==========================================
-def load_cache():
-    if not os.path.exists(CACHE_FILE):
-        return {}
-    try:
-        with open(CACHE_FILE, "r", encoding="utf-8") as f:
-            return json.load(f)
-    except:
-        return {}
+# page_id -> "Ngày cập nhật" đã thông báo; nằm trong bộ nhớ, ghi xuống SQLite theo lô
+notify_store = NotifyStore(STATE_DB)
+notify_store.migrate_json(CACHE_FILE, POLL_STATE_FILE)
 
-def save_cache(cache_data):
-    with open(CACHE_FILE, "w", encoding="utf-8") as f:
-        json.dump(cache_data, f, ensure_ascii=False, indent=4)
+def is_initialized():
+    return notify_store.get_meta("initialized") == "1"
+
+# --- WATERMARK: last_edited_time lớn nhất của lần quét thành công gần nhất ---
+def load_poll_watermark():
+    return notify_store.get_meta("poll_watermark")
+
+def save_poll_watermark(watermark):
+    if not watermark: return
+    notify_store.set_meta("poll_watermark", watermark)
 
 # ==========================================
 # PHẦN 2: CLIENT DISCORD
 # ==========================================
-class MyClient(discord.Client):
+def shard_options():
+    if not SHARD_COUNT:
+        return {}
+    options = {}
+    if SHARD_COUNT != "auto":
+        options["shard_count"] = int(SHARD_COUNT)
+        if SHARD_IDS:
+            options["shard_ids"] = SHARD_IDS
+    elif SHARD_IDS:
+        print("⚠️ SHARD_IDS cần SHARD_COUNT là số, bỏ qua SHARD_IDS.")
+    return options
+
+# Có cấu hình shard -> AutoShardedClient (1 tiến trình giữ nhiều kết nối gateway)
+BaseClient = discord.AutoShardedClient if SHARD_COUNT else discord.Client
+
+class MyClient(BaseClient):
     def __init__(self):
-        super().__init__(intents=intents)
+        super().__init__(intents=intents, **shard_options())
         self.tree = app_commands.CommandTree(self)
+        self.notion = NotionClient(
+            NOTION_TOKEN, DATABASE_ID,
+            base_url=NOTION_BASE_URL,
+            pool_limit=NOTION_POOL_LIMIT,
+            pool_limit_per_host=NOTION_POOL_LIMIT,
+            keepalive_timeout=NOTION_KEEPALIVE,
+            total_timeout=NOTION_TIMEOUT,
+            connect_timeout=NOTION_CONNECT_TIMEOUT,
+            rate=NOTION_RATE,
+            burst=NOTION_BURST,
+            max_concurrency=NOTION_CONCURRENCY,
+            max_retries=NOTION_MAX_RETRIES,
+        )
+
+    async def setup_hook(self):
+        await self.notion.start()
+        # Dựng index từ snapshot ở nền trong lúc đăng nhập gateway; on_ready chờ xong mới chạy tiếp
+        self.snapshot_task = asyncio.create_task(load_catalog_snapshot())
+        await elect_leader()
+        leader_election.start()
+        if WEB_PORT not in ("", "0", "off"):
+            self.web_runner = await keep_alive(health_status, int(WEB_PORT), covers_dir=covers.mirror_dir)
+        # Nút/menu gắn handle trong custom_id: đăng ký 1 lần, dùng được cho mọi tin nhắn cũ
+        self.add_dynamic_items(SeriesSelect, PageButton, CarouselButton)
+        await self.sync_commands()
+
+    async def sync_commands(self):
+        # Discord giới hạn tần suất sync -> chỉ sync khi hash định nghĩa lệnh khác lần trước
+        commands = [cmd.to_dict(self.tree) for cmd in self.tree.get_commands()]
+        digest = hashlib.sha256(json.dumps(commands, sort_keys=True).encode()).hexdigest()
+        if not FORCE_COMMAND_SYNC and notify_store.get_meta("command_hash") == digest:
+            print("✅ Lệnh slash không đổi, bỏ qua đồng bộ.")
+            return
+        try:
+            await self.tree.sync()
+        except discord.HTTPException as e:
+            print(f"⚠️ Đồng bộ lệnh slash thất bại: {e}")
+            return
+        notify_store.set_meta("command_hash", digest)
+        print(f"🔁 Đã đồng bộ {len(commands)} lệnh slash.")
+
+    async def close(self):
+        if leader_election.is_running():
+            leader_election.cancel()
+        if is_leader:
+            # Nhả lease ngay để tiến trình khác lên thay, không phải chờ hết hạn
+            notify_store.release_lease("poller", INSTANCE_ID)
+        await self.notion.close()
+        await covers.close()
+        if getattr(self, "web_runner", None) is not None:
+            await self.web_runner.cleanup()
+        await super().close()
+
+    async def on_app_command_completion(self, interaction, command):
+        # Tính từ lúc Discord tạo interaction: gồm cả độ trễ mạng tới bot
+        elapsed = (discord.utils.utcnow() - interaction.created_at).total_seconds()
+        COMMAND_LATENCY.observe(elapsed, command=command.name)
 
     async def on_ready(self):
         print(f'Bot đã online: {self.user}')
-        await self.tree.sync()
-        
-        if not os.path.exists(CACHE_FILE):
+        try:
+            await self.snapshot_task
+        except Exception as e:
+            print(f"⚠️ Không nạp được snapshot catalog: {e}")
+
+        if not is_leader:
+            # Follower không gọi Notion: chờ leader ghi snapshot rồi nạp lại
+            print(f"👥 Chạy ở vai trò follower ({INSTANCE_ID}).")
+        elif not is_initialized() and catalog.ready:
+            # Có snapshot nhưng mất bot_state.db: lấy mốc từ snapshot, refresh nền sẽ bù phần thiếu
+            print("⚡ Khởi tạo trạng thái thông báo từ snapshot catalog.")
+            mark_initialized(catalog.all_records())
+        elif not is_initialized():
             print("⚠️ Chạy lần đầu: Đang đồng bộ dữ liệu...")
-            await sync_initial_data()
+            try:
+                await sync_initial_data()
+            except NotionError as e:
+                print(f"⚠️ Đồng bộ lần đầu thất bại, sẽ thử lại ở lượt kiểm tra sau: {e}")
         else:
             print("✅ Đã có dữ liệu cũ. Sẵn sàng hoạt động.")
 
+        if not refresh_catalog.is_running():
+            refresh_catalog.start()
+            print(f'📚 Đã bật đồng bộ catalog ({CATALOG_REFRESH_MINUTES:g} phút/lần).')
+        if not refresh_covers.is_running():
+            refresh_covers.start()
+
+        notifier.start()
         if not check_new_anime.is_running():
             check_new_anime.start()
-            print('⏰ Đã bật chế độ tự động kiểm tra (10 phút/lần).')
+            print(f'⏰ Đã bật chế độ tự động kiểm tra ({POLL_INTERVAL_MINUTES:g} phút/lần, {POLL_MODE}).')
 
 client = MyClient()
+catalog = Catalog()
+query_cache = QueryCache(ttl=QUERY_CACHE_TTL, max_entries=QUERY_CACHE_SIZE)
+embed_cache = RenderCache(max_entries=EMBED_CACHE_SIZE)
+random_window = RecentWindow(size=RANDOM_NO_REPEAT)
+covers = CoverCache(
+    margin=COVER_REFRESH_MARGIN, mirror_dir=COVER_MIRROR_DIR, public_url=COVER_PUBLIC_URL, store=notify_store,
+)
 
 # ==========================================
 # PHẦN 3: LOGIC NOTION & XỬ LÝ NGÀY
 # ==========================================
 
-async def fetch_notion(payload):
-    url = f"https://api.notion.com/v1/databases/{DATABASE_ID}/query"
-    headers = {
-        "Authorization": f"Bearer {NOTION_TOKEN}",
-        "Notion-Version": "2022-06-28",
-        "Content-Type": "application/json"
-    }
-    async with aiohttp.ClientSession() as session:
-        async with session.post(url, json=payload, headers=headers) as resp:
-            if resp.status != 200:
-                print(f"Lỗi API Notion: {resp.status}")
-                return None
-            return await resp.json()
-
-async def fetch_all_pages(filter_payload=None):
-    url = f"https://api.notion.com/v1/databases/{DATABASE_ID}/query"
-    headers = {
-        "Authorization": f"Bearer {NOTION_TOKEN}",
-        "Notion-Version": "2022-06-28",
-        "Content-Type": "application/json"
-    }
-    results = []
-    has_more = True
-    cursor = None
-    payload = { "page_size": 100 }
-    if filter_payload:
-        payload.update(filter_payload)
-
-    async with aiohttp.ClientSession() as session:
-        while has_more:
-            if cursor:
-                payload["start_cursor"] = cursor
-            async with session.post(url, json=payload, headers=headers) as resp:
-                if resp.status != 200:
-                    print(f"Lỗi tải trang: {resp.status}")
-                    break
-                data = await resp.json()
-                if "results" in data:
-                    results.extend(data["results"])
-                has_more = data.get("has_more", False)
-                cursor = data.get("next_cursor")
-    return results
-
-def get_prop(page, prop_name):
-    props = page.get("properties", {})
-    prop = props.get(prop_name)
-    if not prop: return "N/A"
-    ptype = prop.get("type")
-    
-    if ptype == "title":
-        return prop["title"][0]["plain_text"] if prop["title"] else "Không tên"
-    elif ptype == "rich_text":
-        return prop["rich_text"][0]["plain_text"] if prop["rich_text"] else "Không có"
-    elif ptype == "number":
-        return str(prop["number"]) if prop["number"] is not None else "?"
-    elif ptype == "select":
-        return prop["select"]["name"] if prop["select"] else "Không rõ"
-    elif ptype == "multi_select":
-        return ", ".join([o['name'] for o in prop['multi_select']]) if prop['multi_select'] else "Không rõ"
-    elif ptype == "status":
-        return prop["status"]["name"] if prop["status"] else "Không rõ"
-    elif ptype == "url":
-        return prop["url"] if prop["url"] else None
-    elif ptype == "checkbox":
-        return prop["checkbox"]
-    elif ptype == "files":
-        if prop["files"]:
-            file_obj = prop["files"][0]
-            if "file" in file_obj: return file_obj["file"]["url"]
-            if "external" in file_obj: return file_obj["external"]["url"]
-    elif ptype == "date":
-        return prop["date"]["start"] if prop["date"] else None
-    return "N/A"
+async def fetch_notion(payload, site="query"):
+    # Truy vấn giống hệt trong TTL dùng lại kết quả; đang chạy thì chờ chung
+    with stage("notion"):
+        return await query_cache.get_or_fetch(payload, lambda p: client.notion.query(p, site=site))
+
+async def fetch_all_pages(filter_payload=None, priority=PRIORITY_SYNC, site="catalog_sync"):
+    return await client.notion.query_all(filter_payload, priority=priority, site=site)
+
+def stream_all_pages(filter_payload=None, partitioned=False, priority=PRIORITY_SYNC, site="catalog_sync"):
+    # Trả từng lô trang cho catalog; tải toàn bộ thì chia phân vùng chạy song song
+    parts = SYNC_PARTITIONS if partitioned else 1
+    return client.notion.query_partitioned(filter_payload, parts=parts, priority=priority, site=site)
+
+async def fetch_anime(page_id):
+    anime = catalog.records.get(page_id)
+    if anime is None:
+        with stage("notion"):
+            page = await client.notion.get_page(page_id)
+        anime = AnimeRecord.from_page(page) if page else None
+    return anime
+
+# --- TRA CỨU: Ưu tiên catalog trong bộ nhớ, Notion chỉ là dự phòng ---
+async def search_anime(payload, local_lookup, site="search"):
+    if catalog.ready:
+        results = local_lookup()
+        if results or not CATALOG_LIVE_FALLBACK:
+            return results
+    data = await fetch_notion(payload, site=site)
+    if not data:
+        return []
+    return [AnimeRecord.from_page(p) for p in data.get("results", [])]
 
 def create_slug_url(title, page_id):
-    value = str(title)
-    value = unicodedata.normalize('NFKD', value).encode('ascii', 'ignore').decode('ascii')
+    value = fold_ascii(title)
     value = re.sub(r'[^\w\s-]', '', value.lower())
     slug = re.sub(r'[-\s]+', '-', value).strip('-')
     suffix = page_id[-4:] 
     return f"{slug}-{suffix}"
 
 # --- HÀM KIỂM TRA ĐỘ LỆCH THỜI GIAN (5 PHÚT) ---
-def is_recently_updated(last_edited_str, user_update_str):
-    if not last_edited_str or not user_update_str:
+def is_recently_updated(anime):
+    # Last Edited (Notion) và Ngày cập nhật (User nhập) đã được đổi sẵn ra epoch
+    if anime.last_edited_at is None or anime.updated_at is None:
         return False
-    try:
-        # Last Edited (UTC Notion) -> VN (UTC+7)
-        last_edited_utc = datetime.fromisoformat(last_edited_str.replace("Z", "+00:00"))
-        last_edited_vn = last_edited_utc.astimezone(timezone(timedelta(hours=7)))
+    return abs(anime.last_edited_at - anime.updated_at) < 300 # Dưới 300 giây (5 phút) là OK
 
-        # Ngày cập nhật (User nhập) -> VN (UTC+7)
-        try:
-            user_date = datetime.strptime(user_update_str, "%B %d, %Y %H:%M")
-            user_date = user_date.replace(tzinfo=timezone(timedelta(hours=7)))
-        except ValueError:
-            if "T" in user_update_str:
-                user_date = datetime.fromisoformat(user_update_str)
-                if user_date.tzinfo is None:
-                    user_date = user_date.replace(tzinfo=timezone(timedelta(hours=7)))
-            else:
-                return False
-
-        # So sánh độ lệch (Giây)
-        diff_seconds = abs((last_edited_vn - user_date).total_seconds())
-        return diff_seconds < 300 # Dưới 300 giây (5 phút) là OK
-
-    except Exception as e:
-        print(f"⚠️ Lỗi so sánh ngày: {e}")
-        return False
-
-async def get_series_list(series_name, current_movie_name):
+async def get_series_list(series_name, current_page_id):
+    # Trả về [(page_id, Tên Romanji)] cùng loạt phim, không tính phim hiện tại
     if series_name in ["Không có", "N/A", None]:
         return []
+    if catalog.ready:
+        return catalog.series_members(series_name, exclude_id=current_page_id)
     payload = {
         "filter": {
             "and": [
@@ -192,27 +322,31 @@ async def get_series_list(series_name, current_movie_name):
         },
         "sorts": [{ "property": "Tên Romanji", "direction": "ascending" }]
     }
-    data = await fetch_notion(payload)
+    try:
+        data = await fetch_notion(payload, site="series")
+    except NotionError as e:
+        # Danh sách cùng loạt chỉ là phụ, lỗi thì bỏ qua
+        print(f"⚠️ Không tải được loạt phim: {e}")
+        return []
     if not data or not data.get("results"):
         return []
     series_movies = []
     for p in data["results"]:
-        name = get_prop(p, "Tên Romanji")
-        if name != current_movie_name:
-            series_movies.append(name)
+        if p["id"] != current_page_id:
+            series_movies.append((p["id"], get_prop(p, "Tên Romanji")))
     return series_movies
 
-async def create_anime_embed(page, web_link):
-    ten_romanji = get_prop(page, "Tên Romanji")
-    ten_tieng_anh = get_prop(page, "Tên tiếng Anh")
-    so_tap_sub = get_prop(page, "Số tập Vietsub")
-    so_tap = get_prop(page, "Số tập")
-    nam = get_prop(page, "Năm")
-    link_tai = get_prop(page, "Tải xuống phụ đề") 
-    anh_bia = get_prop(page, "Ảnh")
-    tom_tat = get_prop(page, "Tóm tắt nội dung")
-    trang_thai = get_prop(page, "Trạng thái")
-    nhom_dich = get_prop(page, "Bản quyền/Nhóm dịch")
+async def create_anime_embed(anime, web_link):
+    ten_romanji = anime.ten_romanji
+    ten_tieng_anh = anime.ten_tieng_anh
+    so_tap_sub = anime.so_tap_sub
+    so_tap = anime.so_tap
+    nam = anime.nam
+    link_tai = anime.link_tai
+    anh_bia = covers.url_for(anime)
+    tom_tat = anime.tom_tat
+    trang_thai = anime.trang_thai
+    nhom_dich = anime.nhom_dich
 
     embed = discord.Embed(title=f"🎬 {ten_romanji}", color=0x00b0f4, url=web_link)
     desc = ""
@@ -227,210 +361,711 @@ async def create_anime_embed(page, web_link):
     embed.add_field(name="Trạng thái", value=trang_thai, inline=True)
     if nhom_dich != "N/A": embed.add_field(name="Nhóm dịch", value=nhom_dich, inline=True)
     if link_tai and link_tai != "N/A": embed.add_field(name="Link tải", value=f"[Google Drive]({link_tai})", inline=False)
-    if anh_bia != "N/A": embed.set_thumbnail(url=anh_bia)
+    if anh_bia: embed.set_thumbnail(url=anh_bia)
+    return embed
+
+def create_card_embed(anime):
+    # Thẻ xem nhanh trong carousel (title "Kết quả i/n" do view tự đặt)
+    ten = anime.ten_romanji
+    nam = anime.nam
+    anh = covers.url_for(anime)
+    tom_tat = anime.tom_tat
+
+    embed = discord.Embed(color=0xffa500)
+    embed.add_field(name="Tên phim", value=ten, inline=False)
+    embed.add_field(name="Năm phát hành", value=nam, inline=False)
+    
+    if tom_tat != "Không có":
+        embed.add_field(name="Sơ lược", value=tom_tat[:100] + "...", inline=False)
+    if anh:
+        embed.set_thumbnail(url=anh)
+    else:
+        embed.set_thumbnail(url="https://via.placeholder.com/150?text=No+Image")
+    embed.set_footer(text="Bấm 'Chọn' để xem chi tiết.")
+    return embed
+
+# --- CACHE EMBED: dựng 1 lần cho mỗi (page_id, last_edited_time, URL ảnh bìa) ---
+async def render_anime_embed(anime):
+    key = ("detail", anime.page_id, anime.last_edited, covers.url_for(anime))
+    with stage("embed"):
+        embed = embed_cache.get(key)
+        if embed is None:
+            slug = create_slug_url(anime.ten_romanji, anime.page_id)
+            web_link = f"{WEB_BASE_URL}/anime/{slug}"
+            embed = await create_anime_embed(anime, web_link)
+            embed_cache.put(key, embed)
     return embed
 
+def render_card_embed(anime):
+    key = ("card", anime.page_id, anime.last_edited, covers.url_for(anime))
+    with stage("embed"):
+        embed = embed_cache.get(key)
+        if embed is None:
+            embed = create_card_embed(anime)
+            embed_cache.put(key, embed)
+    return embed
+
+async def prefetch_anime(records, detail=True, card=False):
+    # Chạy nền: dựng sẵn embed + danh sách cùng loạt để lần bấm sau chỉ còn sửa tin nhắn
+    try:
+        for anime in records:
+            if card:
+                render_card_embed(anime)
+            if detail:
+                await render_anime_embed(anime)
+                await get_series_list(anime.loat_phim, anime.page_id)
+    except Exception as e:
+        print(f"⚠️ Lỗi tải trước: {e}")
+
 # ==========================================
 # PHẦN 4: AUTO SYNC & CHECK NEW
 # ==========================================
 
 async def sync_initial_data():
-    payload_filter = { "filter": { "property": "Public", "checkbox": { "equals": True } } }
-    all_pages = await fetch_all_pages(payload_filter)
-    local_cache = {}
-    for page in all_pages:
-        page_id = page["id"]
-        update_date = get_prop(page, "Ngày cập nhật")
-        if update_date:
-            local_cache[page_id] = update_date
-    save_cache(local_cache)
-
-@tasks.loop(minutes=10)
+    # Tải toàn bộ một lần, dùng chung cho cả catalog và cache thông báo
+    all_records = await catalog.load(stream_all_pages)
+    mark_initialized(all_records)
+    await save_catalog_snapshot()
+
+def mark_initialized(all_records):
+    updates = {}
+    for anime in all_records:
+        if anime.ngay_cap_nhat:
+            updates[anime.page_id] = anime.ngay_cap_nhat
+    notify_store.upsert_many(updates)
+    save_poll_watermark(catalog.watermark)
+    notify_store.set_meta("initialized", "1")
+
+# --- SNAPSHOT CATALOG: KHỞI ĐỘNG NHANH, REFRESH DELTA Ở NỀN ---
+snapshot_revision = None
+snapshot_saved_at = None
+snapshot_mtime = None
+snapshot_lock = asyncio.Lock()   # Lượt refresh catalog và lượt làm mới ảnh bìa không ghi chồng file tạm
+
+async def read_catalog_snapshot():
+    # Đọc + giải mã ở thread riêng; trả về (watermark, [AnimeRecord]) hoặc None
+    data = await asyncio.to_thread(read_snapshot, CATALOG_SNAPSHOT)
+    if data is None: return None
+    return await asyncio.to_thread(decode_snapshot, data)
+
+async def load_catalog_snapshot():
+    # Lúc khởi động: dựng index ở thread riêng vào catalog mới rồi nhận trạng thái một lần
+    global snapshot_revision, snapshot_mtime
+    if not CATALOG_SNAPSHOT: return False
+    mtime = snapshot_file_mtime()
+    start = time.perf_counter()
+    decoded = await read_catalog_snapshot()
+    if decoded is None: return False
+    watermark, records = decoded
+    fresh = await asyncio.to_thread(Catalog().rebuild, records, watermark)
+    catalog.adopt(fresh)
+    snapshot_revision = catalog.revision
+    snapshot_mtime = mtime
+    print(f"⚡ Đã nạp snapshot catalog: {len(catalog)} phim trong {(time.perf_counter() - start) * 1000:.0f}ms.")
+    return True
+
+def snapshot_file_mtime():
+    try:
+        return os.stat(CATALOG_SNAPSHOT).st_mtime_ns
+    except OSError:
+        return None
+
+async def follow_catalog_snapshot():
+    # Follower: leader vừa ghi snapshot mới -> chỉ index lại các phim đã đổi
+    global snapshot_mtime
+    mtime = snapshot_file_mtime()
+    if mtime is None or mtime == snapshot_mtime: return
+    if not catalog.ready:
+        if await load_catalog_snapshot():
+            covers.reload()
+        return
+    decoded = await read_catalog_snapshot()
+    if decoded is None: return
+    snapshot_mtime = mtime
+    watermark, records = decoded
+    changed = catalog.merge(records, watermark)
+    query_cache.invalidate_pages(a.page_id for a in changed)
+    covers.reload()
+
+async def save_catalog_snapshot():
+    # Chỉ ghi khi catalog đã đổi kể từ snapshot trước, và không dày hơn SNAPSHOT_MIN_SECONDS
+    global snapshot_revision, snapshot_saved_at, snapshot_mtime
+    if not CATALOG_SNAPSHOT or not catalog.ready or snapshot_lock.locked():
+        return
+    if catalog.revision == snapshot_revision:
+        return
+    if snapshot_saved_at is not None and time.monotonic() - snapshot_saved_at < SNAPSHOT_MIN_SECONDS:
+        return
+    async with snapshot_lock:
+        revision = catalog.revision
+        state = catalog.snapshot_state()
+        try:
+            data = await asyncio.to_thread(encode_snapshot, state)
+            await asyncio.to_thread(write_snapshot, CATALOG_SNAPSHOT, data)
+        except OSError as e:
+            print(f"⚠️ Không ghi được snapshot catalog: {e}")
+            return
+        snapshot_revision = revision
+        snapshot_saved_at = time.monotonic()
+        snapshot_mtime = snapshot_file_mtime()
+
+# --- ẢNH BÌA: LÀM MỚI URL KÝ TRƯỚC KHI HẾT HẠN, THEO LÔ, Ở NỀN ---
+@tasks.loop(minutes=COVER_REFRESH_MINUTES)
+async def refresh_covers():
+    # Follower nhận URL mới qua snapshot của leader
+    if not catalog.ready or (not is_leader and CATALOG_SNAPSHOT): return
+    try:
+        expiring = covers.expiring(catalog.records.values())
+        if expiring:
+            await refresh_cover_urls(expiring)
+        covers.queue_mirror(catalog.records.values())
+        await covers.mirror_pending()
+    except Exception as e:
+        print(f"⚠️ Lỗi làm mới ảnh bìa: {e}")
+
+async def refresh_cover_urls(page_ids):
+    # Chọn cách ít request hơn: từng trang (1 request/trang) hay quét lại cả database (100 trang/request)
+    full_requests = len(catalog) // 100 + SYNC_PARTITIONS + 1
+    if len(page_ids) > full_requests:
+        # Tải lại toàn bộ: trang không còn trong kết quả (xoá/ẩn) cũng bị bỏ khỏi catalog
+        await catalog.load(lambda f, partitioned: stream_all_pages(f, partitioned=partitioned, site="cover_refresh"))
+        query_cache.clear()
+        print(f"🖼️ Đã làm mới URL ảnh bìa ({len(page_ids)} phim sắp hết hạn, quét lại toàn bộ).")
+    else:
+        pages = await asyncio.gather(
+            *(client.notion.get_page(page_id, priority=PRIORITY_SYNC, site="cover_refresh") for page_id in page_ids),
+            return_exceptions=True,
+        )
+        # Trang lưu trữ / bỏ Public: apply tự gỡ khỏi catalog; 404 (None) = đã xoá hẳn -> gỡ luôn
+        found = [p for p in pages if isinstance(p, dict)]
+        deleted = [page_id for page_id, p in zip(page_ids, pages) if p is None]
+        failed = len(pages) - len(found) - len(deleted)
+        changed = catalog.apply_pages(found, advance_watermark=False) + catalog.discard(deleted)
+        query_cache.invalidate_pages(a.page_id for a in changed)
+        if found or deleted:
+            print(f"🖼️ Đã làm mới URL ảnh bìa: {len(found)} phim, gỡ {len(deleted)} phim đã xoá.")
+        if failed:
+            error = next(p for p in pages if isinstance(p, BaseException))
+            print(f"⚠️ {failed}/{len(page_ids)} phim không làm mới được URL ảnh bìa: {error}")
+    # URL mới làm catalog đổi (revision tăng) -> follower nhận qua snapshot kế tiếp
+    await save_catalog_snapshot()
+
+# --- BẦU LEADER: CHỈ 1 TIẾN TRÌNH KIỂM TRA NOTION VÀ GỬI THÔNG BÁO ---
+is_leader = False
+
+async def elect_leader():
+    global is_leader, last_poll_ok
+    try:
+        acquired = notify_store.acquire_lease("poller", INSTANCE_ID, LEADER_LEASE_SECONDS)
+    except Exception as e:
+        # Không chạm được DB -> coi như mất lease, tránh 2 leader cùng gửi
+        print(f"⚠️ Lỗi gia hạn lease: {e}")
+        acquired = False
+    if acquired and not is_leader:
+        # Tiến trình khác có thể đã ghi thêm -> đọc lại trạng thái trước khi làm leader
+        notify_store.reload()
+        last_poll_ok = time.monotonic()
+        print(f"👑 {INSTANCE_ID} trở thành leader: kiểm tra Notion + gửi thông báo.")
+    elif is_leader and not acquired:
+        print(f"👥 {INSTANCE_ID} mất quyền leader, chuyển sang follower.")
+    is_leader = acquired
+
+# Gia hạn mỗi 1/3 thời hạn: leader chết thì tối đa LEADER_LEASE_SECONDS sau có người thay
+@tasks.loop(seconds=max(1.0, LEADER_LEASE_SECONDS / 3))
+async def leader_election():
+    await elect_leader()
+
+@tasks.loop(minutes=CATALOG_REFRESH_MINUTES)
+async def refresh_catalog():
+    if not is_leader and CATALOG_SNAPSHOT:
+        await follow_catalog_snapshot()
+        return
+    try:
+        changed = await catalog.refresh(stream_all_pages)
+        query_cache.invalidate_pages(a.page_id for a in changed)
+        await save_catalog_snapshot()
+        notify_store.prune_result_sets(RESULT_SET_DAYS * 86400)
+    except Exception as e:
+        print(f"⚠️ Lỗi đồng bộ catalog: {e}")
+
+def build_poll_filter(watermark):
+    if POLL_MODE != "delta" or not watermark:
+        return PUBLIC_FILTER
+    # on_or_after: Notion làm tròn last_edited_time theo phút, chấp nhận lấy trùng vài trang
+    return {
+        "filter": {
+            "and": [
+                { "property": "Public", "checkbox": { "equals": True } },
+                { "timestamp": "last_edited_time", "last_edited_time": { "on_or_after": watermark } }
+            ]
+        }
+    }
+
+async def build_notification(anime, is_new):
+    embed = await render_anime_embed(anime)
+    if is_new:
+        embed.set_author(name="🔥 Anime Mới Tinh!", icon_url="https://cdn-icons-png.flaticon.com/512/2965/2965358.png")
+    else:
+        embed.set_author(name="🆕 Cập Nhật Mới!", icon_url="https://cdn-icons-png.flaticon.com/512/1680/1680899.png")
+    series_list = await get_series_list(anime.loat_phim, anime.page_id)
+    return embed, AnimeView(series_list)
+
+def build_digest_embed(events):
+    lines = []
+    for anime, is_new in events:
+        slug = create_slug_url(anime.ten_romanji, anime.page_id)
+        icon = "🔥" if is_new else "🆕"
+        lines.append(f"{icon} [{anime.ten_romanji[:80]}]({WEB_BASE_URL}/anime/{slug})")
+    embed = discord.Embed(title=f"📢 {len(events)} anime vừa cập nhật", color=0x00b0f4)
+    embed.description = "\n".join(lines)
+    return embed
+
+# ==========================================
+# HÀNG ĐỢI THÔNG BÁO: poller đẩy sự kiện, worker dựng embed song song và gửi có giới hạn tốc độ
+# ==========================================
+class NotificationDispatcher:
+    def __init__(self, workers=3, rate=1.0, burst=5, digest_threshold=0, digest_size=20, max_attempts=3):
+        self.queue = asyncio.Queue()
+        self.workers = workers
+        self.rate = rate
+        self.burst = burst
+        self.digest_threshold = digest_threshold
+        self.digest_size = digest_size
+        self.max_attempts = max_attempts
+        self._limiters = {}   # channel_id -> RequestScheduler
+        self._pending = {}    # page_id -> (Ngày cập nhật, last_edited_time) chưa gửi xong
+        self._tasks = []
+
+    def start(self):
+        if self._tasks: return
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    def is_pending(self, anime):
+        entry = self._pending.get(anime.page_id)
+        return entry is not None and entry[0] == anime.ngay_cap_nhat
+
+    def watermark_floor(self):
+        # Watermark không được vượt qua phim chưa gửi, để restart giữa chừng vẫn quét lại
+        return min((edited for _, edited in self._pending.values() if edited), default=None)
+
+    def submit(self, channel, events):
+        for anime, _ in events:
+            self._pending[anime.page_id] = (anime.ngay_cap_nhat, anime.last_edited)
+        if self.digest_threshold and len(events) > self.digest_threshold:
+            for i in range(0, len(events), self.digest_size):
+                self.queue.put_nowait(("digest", channel, events[i:i + self.digest_size]))
+        else:
+            for event in events:
+                self.queue.put_nowait(("single", channel, [event]))
+
+    def _limiter(self, channel_id):
+        limiter = self._limiters.get(channel_id)
+        if limiter is None:
+            limiter = RequestScheduler(rate=self.rate, burst=self.burst, max_concurrency=1)
+            self._limiters[channel_id] = limiter
+        return limiter
+
+    async def _worker(self):
+        while True:
+            kind, channel, events = await self.queue.get()
+            try:
+                await self._deliver(kind, channel, events)
+            except Exception as e:
+                print(f"⚠️ Lỗi gửi thông báo: {e}")
+            finally:
+                for anime, _ in events:
+                    if self._pending.get(anime.page_id) == (anime.ngay_cap_nhat, anime.last_edited):
+                        del self._pending[anime.page_id]
+                self.queue.task_done()
+
+    async def _deliver(self, kind, channel, events):
+        if not is_leader:
+            # Mất lease: bỏ qua, leader mới quét lại từ watermark (không vượt quá phim chưa gửi)
+            return
+        if kind == "digest":
+            embed, view = build_digest_embed(events), None
+        else:
+            embed, view = await build_notification(*events[0])
+
+        limiter = self._limiter(channel.id)
+        for attempt in range(self.max_attempts):
+            await limiter.acquire()
+            try:
+                if view is None:
+                    await channel.send(embed=embed)
+                else:
+                    await channel.send(embed=embed, view=view)
+                break
+            except discord.HTTPException as e:
+                print(f"⚠️ Gửi thất bại ({attempt + 1}/{self.max_attempts}): {e}")
+            finally:
+                limiter.release()
+            await asyncio.sleep(2 ** attempt)
+        else:
+            return
+
+        # Ghi từng mục ngay sau khi gửi: restart giữa đợt không báo lại phim đã gửi
+        for anime, _ in events:
+            print(f"🔔 Gửi thông báo: {anime.ten_romanji}")
+        notify_store.upsert_many({ anime.page_id: anime.ngay_cap_nhat for anime, _ in events })
+
+notifier = NotificationDispatcher(
+    workers=NOTIFY_WORKERS, rate=NOTIFY_RATE, burst=NOTIFY_BURST,
+    digest_threshold=NOTIFY_DIGEST_THRESHOLD,
+)
+
+# Thời điểm (monotonic) lượt kiểm tra gần nhất chạy xong không lỗi, cho /healthz
+last_poll_ok = None
+
+@tasks.loop(minutes=POLL_INTERVAL_MINUTES)
 async def check_new_anime():
-    if not CHANNEL_ID: return
-    payload_filter = { "filter": { "property": "Public", "checkbox": { "equals": True } } }
-    all_pages = await fetch_all_pages(payload_filter)
-    if not all_pages: return
+    global last_poll_ok
+    if not CHANNEL_ID or not is_leader: return
+    start = time.perf_counter()
+    scanned = await poll_changes()
+    POLL_DURATION.observe(time.perf_counter() - start)
+    if scanned is None: return
+    POLL_PAGES.inc(scanned)
+    POLL_LAST_PAGES.set(scanned)
+    last_poll_ok = time.monotonic()
+
+async def poll_changes():
+    # Trả về số trang đã quét, None nếu lượt này thất bại
+    if not is_initialized():
+        # Lần đồng bộ đầu chưa xong -> làm lại thay vì thông báo toàn bộ kho phim
+        try:
+            await sync_initial_data()
+        except NotionError as e:
+            print(f"⚠️ Đồng bộ lần đầu thất bại: {e}")
+            return None
+        return 0
 
-    local_cache = load_cache()
-    has_changes = False
+    watermark = load_poll_watermark()
+    try:
+        all_pages = await fetch_all_pages(build_poll_filter(watermark), priority=PRIORITY_POLL, site="poll")
+    except NotionError as e:
+        # Giữ nguyên watermark để lượt sau quét lại đúng khoảng này
+        print(f"⚠️ Bỏ qua lượt kiểm tra: {e}")
+        return None
+    if not all_pages: return 0
+    # Đọc JSON Notion 1 lần, phần còn lại chỉ dùng AnimeRecord
+    all_records = [AnimeRecord.from_page(p) for p in all_pages]
+    del all_pages
+
+    # Trang vừa tải cũng là dữ liệu mới nhất cho catalog (không tiến watermark delta: kết quả đã lọc Public)
+    changed_records = catalog.apply(all_records, advance_watermark=False) if catalog.ready else all_records
+    query_cache.invalidate_pages(a.page_id for a in changed_records)
+    new_watermark = max([a.last_edited for a in all_records] + ([watermark] if watermark else []))
+
+    updates = {}
+    events = []
+    # Phim mới có thể khớp các truy vấn đã cache -> bỏ toàn bộ
+    if any(a.page_id not in notify_store for a in all_records):
+        query_cache.clear()
     channel = client.get_channel(int(CHANNEL_ID))
-    if not channel: return
+    if channel is None:
+        # Chia shard nhiều tiến trình: kênh có thể thuộc shard khác -> lấy qua HTTP
+        try:
+            channel = await client.fetch_channel(int(CHANNEL_ID))
+        except discord.HTTPException as e:
+            print(f"⚠️ Không lấy được kênh thông báo: {e}")
+            return None
 
-    for page in all_pages:
-        page_id = page["id"]
-        last_edited = page["last_edited_time"]
-        user_update = get_prop(page, "Ngày cập nhật")
+    for anime in all_records:
+        page_id = anime.page_id
+        user_update = anime.ngay_cap_nhat
         
         if not user_update: continue
 
         # Logic so sánh 2 ngày (Cho phép lệch 5 phút)
-        is_fresh_update = is_recently_updated(last_edited, user_update)
+        is_fresh_update = is_recently_updated(anime)
         
         if not is_fresh_update:
-            if local_cache.get(page_id) != user_update:
-                local_cache[page_id] = user_update
-                has_changes = True
+            if notify_store.get(page_id) != user_update:
+                updates[page_id] = user_update
             continue 
 
         # Nếu trùng ngày -> Kiểm tra cache xem có phải tin mới ko
-        old_date = local_cache.get(page_id)
-        if user_update != old_date:
-            ten_phim = get_prop(page, "Tên Romanji")
-            slug_url = create_slug_url(ten_phim, page_id)
-            web_link = f"{WEB_BASE_URL}/anime/{slug_url}"
-            
-            embed = await create_anime_embed(page, web_link)
-            if page_id not in local_cache:
-                embed.set_author(name="🔥 Anime Mới Tinh!", icon_url="https://cdn-icons-png.flaticon.com/512/2965/2965358.png")
-            else:
-                embed.set_author(name="🆕 Cập Nhật Mới!", icon_url="https://cdn-icons-png.flaticon.com/512/1680/1680899.png")
-            
-            series_name = get_prop(page, "Loạt phim")
-            series_list = await get_series_list(series_name, ten_phim)
-            view = AnimeView(series_list)
-            
-            print(f"🔔 Gửi thông báo: {ten_phim}")
-            await channel.send(embed=embed, view=view)
-            
-            local_cache[page_id] = user_update
-            has_changes = True
+        old_date = notify_store.get(page_id)
+        if user_update != old_date and not notifier.is_pending(anime):
+            events.append((anime, page_id not in notify_store))
+
+    notify_store.upsert_many(updates)
+    if events:
+        print(f"📨 Xếp hàng {len(events)} thông báo.")
+        notifier.submit(channel, events)
+    floor = notifier.watermark_floor()
+    save_poll_watermark(min(new_watermark, floor) if floor else new_watermark)
+    stats = query_cache.stats()
+    print(f"📊 Cache truy vấn: {stats['hits']} hit / {stats['misses']} miss / {stats['coalesced']} gộp, {stats['entries']} mục.")
+    return len(all_records)
 
-    if has_changes:
-        save_cache(local_cache)
+# ==========================================
+# PHẦN 4B: HEALTH CHECK & METRICS
+# ==========================================
+def health_status():
+    # Khoẻ = gateway đang kết nối + lượt kiểm tra gần nhất không quá 3 chu kỳ
+    poll_age = None if last_poll_ok is None else time.monotonic() - last_poll_ok
+    poll_stale = bool(CHANNEL_ID) and is_leader and check_new_anime.is_running() and (
+        poll_age is None and check_new_anime.current_loop > 2
+        or poll_age is not None and poll_age > POLL_INTERVAL_MINUTES * 60 * 3
+    )
+    gateway_ok = client.is_ready() and not client.is_closed()
+    info = {
+        "gateway_connected": gateway_ok,
+        "latency_ms": round(client.latency * 1000) if gateway_ok and math.isfinite(client.latency) else None,
+        "last_poll_age_seconds": None if poll_age is None else round(poll_age),
+        "leader": is_leader,
+        "instance": INSTANCE_ID,
+        "shards": sorted(client.shards) if SHARD_COUNT else None,
+        "catalog_ready": catalog.ready,
+        "catalog_size": len(catalog.records),
+    }
+    return gateway_ok and not poll_stale, info
+
+REGISTRY.register(Gauge(
+    "cache_lookups", "Số lần tra cache theo kết quả", labels=("cache", "result"),
+    callback=lambda: {
+        ("query", "hit"): query_cache.hits + query_cache.coalesced,
+        ("query", "miss"): query_cache.misses,
+        ("embed", "hit"): embed_cache.hits,
+        ("embed", "miss"): embed_cache.misses,
+    },
+))
+REGISTRY.register(Gauge(
+    "cache_hit_ratio", "Tỉ lệ trúng cache", labels=("cache",),
+    callback=lambda: {
+        ("query",): query_cache.stats()["hit_rate"],
+        ("embed",): embed_cache.hits / (embed_cache.hits + embed_cache.misses) if embed_cache.hits + embed_cache.misses else 0.0,
+    },
+))
+REGISTRY.register(Gauge(
+    "cache_entries", "Số mục đang nằm trong cache", labels=("cache",),
+    callback=lambda: { ("query",): len(query_cache), ("embed",): len(embed_cache) },
+))
+REGISTRY.register(Gauge(
+    "catalog_records", "Số phim trong catalog bộ nhớ",
+    callback=lambda: { (): len(catalog.records) },
+))
 
 # ==========================================
 # PHẦN 5: VIEW & INTERACTION
 # ==========================================
+# View không giữ dữ liệu: custom_id mang handle danh sách kết quả + vị trí,
+# khi bấm mới lấy bản ghi từ catalog. Nút vẫn chạy sau khi restart / hết timeout.
 
-class SeriesSelect(Select):
-    def __init__(self, series_movies):
-        options = [discord.SelectOption(label=m[:100], description="Bấm để xem") for m in series_movies[:25]]
-        super().__init__(placeholder="Cùng loạt phim", min_values=1, max_values=1, options=options)
+_background_tasks = set()
+
+def spawn(coro):
+    # Giữ tham chiếu tới task chạy nền để không bị thu gom giữa chừng
+    task = asyncio.create_task(untraced(coro))
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+    return task
+
+def save_results(results):
+    page_ids = results.page_ids if isinstance(results, LazyRecords) else [a.page_id for a in results]
+    return notify_store.save_result_set(page_ids)
+
+async def load_results(interaction, handle):
+    page_ids = notify_store.load_result_set(handle)
+    if page_ids is None:
+        await interaction.response.send_message("⌛ Kết quả này đã hết hạn, bạn tìm lại nhé!", ephemeral=True)
+    return page_ids
+
+async def resolve_anime(interaction, page_id):
+    # Có trong catalog -> trả lời ngay; phải gọi Notion -> defer trước để không quá 3 giây
+    if page_id not in catalog.records and not interaction.response.is_done():
+        await interaction.response.defer()
+    anime = await fetch_anime(page_id)
+    if anime is None:
+        message = "❌ Phim này không còn trong kho."
+        if interaction.response.is_done():
+            await interaction.followup.send(message, ephemeral=True)
+        else:
+            await interaction.response.send_message(message, ephemeral=True)
+    return anime
+
+async def edit_view_message(interaction, **kwargs):
+    if interaction.response.is_done():
+        await interaction.edit_original_response(**kwargs)
+    else:
+        await interaction.response.edit_message(**kwargs)
+
+def prefetch_ids(page_ids, detail=True, card=False):
+    records = [catalog.records.get(i) for i in page_ids]
+    spawn(prefetch_anime([a for a in records if a], detail=detail, card=card))
+
+class SeriesSelect(discord.ui.DynamicItem[Select], template=r"anime:series"):
+    def __init__(self, options):
+        super().__init__(Select(
+            placeholder="Cùng loạt phim", min_values=1, max_values=1, options=options, custom_id="anime:series",
+        ))
+
+    @classmethod
+    def for_series(cls, series_movies):
+        options = [discord.SelectOption(label=name[:100], value=page_id, description="Bấm để xem") for page_id, name in series_movies[:25]]
+        return cls(options)
+
+    @classmethod
+    async def from_custom_id(cls, interaction, item, match):
+        return cls(item.options)
 
     async def callback(self, interaction: discord.Interaction):
         await interaction.response.defer()
-        selected_movie = self.values[0]
-        payload = { "filter": { "property": "Tên Romanji", "title": { "equals": selected_movie } } }
-        data = await fetch_notion(payload)
-        if data and data.get("results"):
-            page = data["results"][0]
-            ten_phim = get_prop(page, "Tên Romanji")
-            slug_url = create_slug_url(ten_phim, page["id"])
-            web_link = f"{WEB_BASE_URL}/anime/{slug_url}"
-            embed = await create_anime_embed(page, web_link)
-            series_name = get_prop(page, "Loạt phim")
-            series_list = await get_series_list(series_name, ten_phim)
+        anime = await fetch_anime(self.item.values[0])
+        if anime:
+            embed = await render_anime_embed(anime)
+            series_name = anime.loat_phim
+            series_list = await get_series_list(series_name, anime.page_id)
             view = AnimeView(series_list)
             await interaction.edit_original_response(embed=embed, view=view)
 
 class AnimeView(View):
     def __init__(self, series_movies):
-        super().__init__(timeout=600)
+        super().__init__(timeout=None)
         if series_movies:
-            self.add_item(SeriesSelect(series_movies))
-
-class AnimePaginationView(View):
-    def __init__(self, results):
-        super().__init__(timeout=600)
-        self.results = results
-        self.current_page = 0
-    async def update_msg(self, interaction):
-        page = self.results[self.current_page]
-        ten = get_prop(page, "Tên Romanji")
-        slug = create_slug_url(ten, page["id"])
-        link = f"{WEB_BASE_URL}/anime/{slug}"
-        embed = await create_anime_embed(page, link)
-        embed.set_footer(text=f"Phim thứ {self.current_page + 1}/{len(self.results)}")
-        await interaction.response.edit_message(embed=embed, view=self)
-    @discord.ui.button(label="◀️ Trước", style=discord.ButtonStyle.secondary)
-    async def prev_btn(self, interaction, button):
-        if self.current_page > 0:
-            self.current_page -= 1
-            await self.update_msg(interaction)
-    @discord.ui.button(label="Sau ▶️", style=discord.ButtonStyle.primary)
-    async def next_btn(self, interaction, button):
-        if self.current_page < len(self.results) - 1:
-            self.current_page += 1
-            await self.update_msg(interaction)
-
-# --- CLASS MỚI: VIEW LƯỚT XEM (SLIDE) ---
-class SearchCarouselView(discord.ui.View):
-    def __init__(self, results, user):
-        super().__init__(timeout=120)
-        self.results = results
-        self.user = user
-        self.current_index = 0
-        self.update_buttons()
-
-    def update_buttons(self):
-        self.children[0].disabled = (self.current_index == 0)
-        self.children[2].disabled = (self.current_index == len(self.results) - 1)
-        self.children[1].label = f"✅ Chọn: {get_prop(self.results[self.current_index], 'Tên Romanji')[:15]}..."
-
-    async def get_page_embed(self):
-        page = self.results[self.current_index]
-        ten = get_prop(page, "Tên Romanji")
-        nam = get_prop(page, "Năm") 
-        anh = get_prop(page, "Ảnh")
-        tom_tat = get_prop(page, "Tóm tắt nội dung")
-        
-        embed = discord.Embed(title=f"🔎 Kết quả {self.current_index + 1}/{len(self.results)}", color=0xffa500)
-        embed.add_field(name="Tên phim", value=ten, inline=False)
-        embed.add_field(name="Năm phát hành", value=nam, inline=False)
-        
-        if tom_tat != "Không có":
-            embed.add_field(name="Sơ lược", value=tom_tat[:100] + "...", inline=False)
-        if anh != "N/A":
-            embed.set_thumbnail(url=anh)
+            self.add_item(SeriesSelect.for_series(series_movies))
+
+# --- PHÂN TRANG /mua: ai cũng bấm được ---
+class PageButton(discord.ui.DynamicItem[Button], template=r"anime:m:(?P<step>[pn]):(?P<handle>[0-9a-f]+):(?P<index>\d+)"):
+    def __init__(self, step, handle, index, disabled=False):
+        label, style = ("◀️ Trước", discord.ButtonStyle.secondary) if step == "p" else ("Sau ▶️", discord.ButtonStyle.primary)
+        super().__init__(Button(label=label, style=style, disabled=disabled, custom_id=f"anime:m:{step}:{handle}:{index}"))
+        self.step = step
+        self.handle = handle
+        self.index = index
+
+    @classmethod
+    async def from_custom_id(cls, interaction, item, match):
+        return cls(match["step"], match["handle"], int(match["index"]))
+
+    async def callback(self, interaction: discord.Interaction):
+        page_ids = await load_results(interaction, self.handle)
+        if page_ids is None: return
+        index = self.index + (1 if self.step == "n" else -1)
+        if not 0 <= index < len(page_ids):
+            await interaction.response.defer()
+            return
+        anime = await resolve_anime(interaction, page_ids[index])
+        if anime is None: return
+        embed = await render_anime_embed(anime)
+        embed.set_footer(text=f"Phim thứ {index + 1}/{len(page_ids)}")
+        await edit_view_message(interaction, embed=embed, view=pagination_view(self.handle, index, len(page_ids)))
+        prefetch_ids([page_ids[i] for i in (index + 1, index - 1) if 0 <= i < len(page_ids)])
+
+def pagination_view(handle, index, total):
+    view = View(timeout=None)
+    view.add_item(PageButton("p", handle, index, disabled=index == 0))
+    view.add_item(PageButton("n", handle, index, disabled=index >= total - 1))
+    return view
+
+# --- LƯỚT XEM KẾT QUẢ /tim: chỉ người gọi lệnh bấm được ---
+class CarouselButton(discord.ui.DynamicItem[Button], template=r"anime:c:(?P<action>[pkn]):(?P<handle>[0-9a-f]+):(?P<index>\d+):(?P<owner>\d+)"):
+    def __init__(self, action, handle, index, owner_id, label=None, disabled=False):
+        if action == "k":
+            style = discord.ButtonStyle.success
+            label = label or "✅ CHỌN"
         else:
-            embed.set_thumbnail(url="https://via.placeholder.com/150?text=No+Image")
-        embed.set_footer(text="Bấm 'Chọn' để xem chi tiết.")
-        return embed
-
-    @discord.ui.button(label="◀️", style=discord.ButtonStyle.secondary)
-    async def prev_btn(self, interaction: discord.Interaction, button: discord.ui.Button):
-        if interaction.user != self.user: return
-        if self.current_index > 0:
-            self.current_index -= 1
-            self.update_buttons()
-            embed = await self.get_page_embed()
-            await interaction.response.edit_message(embed=embed, view=self)
-
-    @discord.ui.button(label="✅ CHỌN", style=discord.ButtonStyle.success)
-    async def select_btn(self, interaction: discord.Interaction, button: discord.ui.Button):
-        if interaction.user != self.user: return
+            style = discord.ButtonStyle.secondary
+            label = "◀️" if action == "p" else "▶️"
+        super().__init__(Button(
+            label=label, style=style, disabled=disabled,
+            custom_id=f"anime:c:{action}:{handle}:{index}:{owner_id}",
+        ))
+        self.action = action
+        self.handle = handle
+        self.index = index
+        self.owner_id = owner_id
+
+    @classmethod
+    async def from_custom_id(cls, interaction, item, match):
+        return cls(match["action"], match["handle"], int(match["index"]), int(match["owner"]), label=item.label)
+
+    async def interaction_check(self, interaction: discord.Interaction):
+        if interaction.user.id == self.owner_id:
+            return True
+        await interaction.response.send_message("🔒 Chỉ người tìm mới điều khiển được danh sách này.", ephemeral=True)
+        return False
+
+    async def callback(self, interaction: discord.Interaction):
+        page_ids = await load_results(interaction, self.handle)
+        if page_ids is None: return
+        if self.action == "k":
+            await self.pick(interaction, page_ids)
+            return
+        index = self.index + (1 if self.action == "n" else -1)
+        if not 0 <= index < len(page_ids):
+            await interaction.response.defer()
+            return
+        anime = await resolve_anime(interaction, page_ids[index])
+        if anime is None: return
+        embed, view = carousel_page(self.handle, page_ids, index, self.owner_id, anime)
+        await edit_view_message(interaction, embed=embed, view=view)
+
+    async def pick(self, interaction, page_ids):
+        if self.index >= len(page_ids):
+            await interaction.response.defer()
+            return
         await interaction.response.defer()
-        page = self.results[self.current_index]
-        
-        ten_full = get_prop(page, "Tên Romanji")
-        slug = create_slug_url(ten_full, page["id"])
-        web_link = f"{WEB_BASE_URL}/anime/{slug}"
-        embed = await create_anime_embed(page, web_link)
-        
-        series_name = get_prop(page, "Loạt phim")
-        series_list = await get_series_list(series_name, ten_full)
+        anime = await resolve_anime(interaction, page_ids[self.index])
+        if anime is None: return
+        embed = await render_anime_embed(anime)
+
+        series_name = anime.loat_phim
+        series_list = await get_series_list(series_name, anime.page_id)
         if series_list:
-             text_list = "\n".join([f"• {name}" for name in series_list])
+             text_list = "\n".join([f"• {name}" for _, name in series_list])
              embed.description += f"\n**Cùng loạt phim:**\n{text_list}\n"
         await interaction.edit_original_response(embed=embed, view=AnimeView(series_list))
 
-    @discord.ui.button(label="▶️", style=discord.ButtonStyle.secondary)
-    async def next_btn(self, interaction: discord.Interaction, button: discord.ui.Button):
-        if interaction.user != self.user: return
-        if self.current_index < len(self.results) - 1:
-            self.current_index += 1
-            self.update_buttons()
-            embed = await self.get_page_embed()
-            await interaction.response.edit_message(embed=embed, view=self)
+def carousel_page(handle, page_ids, index, owner_id, anime):
+    embed = render_card_embed(anime)
+    embed.title = f"🔎 Kết quả {index + 1}/{len(page_ids)}"
+    view = View(timeout=None)
+    view.add_item(CarouselButton("p", handle, index, owner_id, disabled=index == 0))
+    view.add_item(CarouselButton("k", handle, index, owner_id, label=f"✅ Chọn: {anime.ten_romanji[:15]}..."))
+    view.add_item(CarouselButton("n", handle, index, owner_id, disabled=index >= len(page_ids) - 1))
+    # Thẻ của phim trước/sau + embed chi tiết của phim đang xem (cho nút Chọn)
+    prefetch_ids([page_ids[i] for i in (index + 1, index - 1) if 0 <= i < len(page_ids)], detail=False, card=True)
+    prefetch_ids([anime.page_id])
+    return embed, view
 
 # ==========================================
 # PHẦN 6: COMMANDS
 # ==========================================
 
+@client.tree.error
+async def on_app_command_error(interaction: discord.Interaction, error):
+    if interaction.command is not None:
+        elapsed = (discord.utils.utcnow() - interaction.created_at).total_seconds()
+        COMMAND_LATENCY.observe(elapsed, command=interaction.command.name)
+    original = getattr(error, "original", error)
+    if not isinstance(original, NotionError):
+        traceback.print_exception(type(error), error, error.__traceback__)
+        return
+    print(f"⚠️ Lệnh /{interaction.command.name if interaction.command else '?'} lỗi Notion: {original}")
+    message = "⚠️ Notion đang quá tải, bạn thử lại sau ít phút nhé!"
+    if interaction.response.is_done():
+        await interaction.followup.send(message, ephemeral=True)
+    else:
+        await interaction.response.send_message(message, ephemeral=True)
+
+async def title_autocomplete(interaction: discord.Interaction, current: str):
+    # Trả lời từ index trong bộ nhớ, không gọi Notion (Discord chỉ chờ ~3 giây)
+    if not catalog.ready or not current.strip():
+        return []
+    return [
+        app_commands.Choice(name=anime.ten_romanji[:100], value=anime.ten_romanji[:100])
+        for anime in catalog.suggest_titles(current, 25)
+    ]
+
 @client.tree.command(name="timphim", description="Tìm kiếm anime (Nhập chính xác)")
+@app_commands.autocomplete(ten_phim=title_autocomplete)
+@traced(SLOW_COMMAND_SECONDS)
 async def timphim(interaction: discord.Interaction, ten_phim: str):
-    await interaction.response.defer()
+    with stage("defer"):
+        await interaction.response.defer()
     payload = {
         "filter": {
             "and": [
@@ -442,26 +1077,28 @@ async def timphim(interaction: discord.Interaction, ten_phim: str):
             ]
         }
     }
-    data = await fetch_notion(payload)
-    if not data or not data.get("results"):
-        await interaction.followup.send(f"❌ Không tìm thấy phim: **{ten_phim}**")
+    results = await search_anime(payload, lambda: catalog.search_titles(ten_phim), site="timphim")
+    if not results:
+        with stage("send"):
+            await interaction.followup.send(f"❌ Không tìm thấy phim: **{ten_phim}**")
         return
-    page = data["results"][0]
-    ten_full = get_prop(page, "Tên Romanji")
-    slug = create_slug_url(ten_full, page["id"])
-    web_link = f"{WEB_BASE_URL}/anime/{slug}"
-    embed = await create_anime_embed(page, web_link)
-    series_name = get_prop(page, "Loạt phim")
-    series_list = await get_series_list(series_name, ten_full)
+    anime = results[0]
+    embed = await render_anime_embed(anime)
+    series_name = anime.loat_phim
+    series_list = await get_series_list(series_name, anime.page_id)
     if series_list:
-        text_list = "\n".join([f"• {name}" for name in series_list])
+        text_list = "\n".join([f"• {name}" for _, name in series_list])
         embed.description += f"\n**Cùng loạt phim:**\n{text_list}\n"
-    await interaction.followup.send(embed=embed, view=AnimeView(series_list))
+    with stage("send"):
+        await interaction.followup.send(embed=embed, view=AnimeView(series_list))
 
 # --- LỆNH TÌM MỚI (SLIDE VIEW) ---
 @client.tree.command(name="tim", description="Tìm phim (Duyệt danh sách có Ảnh)")
+@app_commands.autocomplete(tu_khoa=title_autocomplete)
+@traced(SLOW_COMMAND_SECONDS)
 async def tim(interaction: discord.Interaction, tu_khoa: str):
-    await interaction.response.defer()
+    with stage("defer"):
+        await interaction.response.defer()
     
     payload = {
         "filter": {
@@ -475,54 +1112,84 @@ async def tim(interaction: discord.Interaction, tu_khoa: str):
         },
         "sorts": [{ "property": "Tên Romanji", "direction": "ascending" }]
     }
-    data = await fetch_notion(payload)
+    results = await search_anime(payload, lambda: catalog.search_titles(tu_khoa), site="tim")
     
-    if not data or not data.get("results"):
-        await interaction.followup.send(f"❌ Không tìm thấy phim nào chứa từ: **{tu_khoa}**")
+    if not results:
+        with stage("send"):
+            await interaction.followup.send(f"❌ Không tìm thấy phim nào chứa từ: **{tu_khoa}**")
         return
 
-    results = data["results"]
     if len(results) == 1:
-        page = results[0]
-        ten_full = get_prop(page, "Tên Romanji")
-        slug = create_slug_url(ten_full, page["id"])
-        web_link = f"{WEB_BASE_URL}/anime/{slug}"
-        embed = await create_anime_embed(page, web_link)
-        series_name = get_prop(page, "Loạt phim")
-        series_list = await get_series_list(series_name, ten_full)
+        anime = results[0]
+        embed = await render_anime_embed(anime)
+        series_name = anime.loat_phim
+        series_list = await get_series_list(series_name, anime.page_id)
         if series_list:
-             embed.description += f"\n**Cùng loạt phim:**\n" + "\n".join([f"• {n}" for n in series_list])
-        await interaction.followup.send(embed=embed, view=AnimeView(series_list))
+             embed.description += f"\n**Cùng loạt phim:**\n" + "\n".join([f"• {n}" for _, n in series_list])
+        with stage("send"):
+            await interaction.followup.send(embed=embed, view=AnimeView(series_list))
         return
 
     # Dùng View Lướt Xem (Carousel)
-    view = SearchCarouselView(results, interaction.user)
-    embed = await view.get_page_embed() 
-    await interaction.followup.send(content=f"🔎 Tìm thấy **{len(results)}** kết quả cho '**{tu_khoa}**':", embed=embed, view=view)
+    handle = save_results(results)
+    embed, view = carousel_page(handle, [a.page_id for a in results], 0, interaction.user.id, results[0])
+    with stage("send"):
+        await interaction.followup.send(content=f"🔎 Tìm thấy **{len(results)}** kết quả cho '**{tu_khoa}**':", embed=embed, view=view)
+
+@client.tree.command(name="timnoidung", description="Tìm theo nội dung, loạt phim, nhóm dịch (xếp theo độ liên quan)")
+@app_commands.describe(noi_dung="Vd: du hành thời gian, Nhóm Sakura...")
+@traced(SLOW_COMMAND_SECONDS)
+async def timnoidung(interaction: discord.Interaction, noi_dung: str):
+    # Notion không xếp hạng được -> chỉ chạy trên index toàn văn của catalog
+    if not catalog.ready:
+        with stage("send"):
+            await interaction.response.send_message("⏳ Bot đang tải dữ liệu, bạn thử lại sau ít phút nhé!", ephemeral=True)
+        return
+    with stage("defer"):
+        await interaction.response.defer()
+    results = catalog.search_text(noi_dung)
+    if not results:
+        with stage("send"):
+            await interaction.followup.send(f"❌ Không tìm thấy phim nào liên quan: **{noi_dung}**")
+        return
+
+    handle = save_results(results)
+    embed, view = carousel_page(handle, [a.page_id for a in results], 0, interaction.user.id, results[0])
+    with stage("send"):
+        await interaction.followup.send(content=f"📖 **{len(results)}** phim liên quan nhất tới '**{noi_dung}**':", embed=embed, view=view)
 
 @client.tree.command(name="ngaunhien", description="Random 1 bộ anime")
+@traced(SLOW_COMMAND_SECONDS)
 async def ngaunhien(interaction: discord.Interaction):
-    await interaction.response.defer()
-    payload = { "page_size": 100, "filter": { "property": "Public", "checkbox": { "equals": True } } }
-    data = await fetch_notion(payload)
-    if data and data.get("results"):
-        page = random.choice(data["results"])
-        ten_full = get_prop(page, "Tên Romanji")
-        slug = create_slug_url(ten_full, page["id"])
-        web_link = f"{WEB_BASE_URL}/anime/{slug}"
-        embed = await create_anime_embed(page, web_link)
+    with stage("defer"):
+        await interaction.response.defer()
+    window_key = interaction.channel_id if RANDOM_NO_REPEAT_SCOPE == "channel" else interaction.user.id
+    if catalog.ready:
+        # Bốc trực tiếp từ catalog: đều trên toàn kho, không gọi Notion
+        anime = catalog.random_record(exclude=random_window.get(window_key))
+    else:
+        payload = { "page_size": 100, "filter": { "property": "Public", "checkbox": { "equals": True } } }
+        results = await search_anime(payload, catalog.all_records, site="ngaunhien")
+        anime = random.choice(results) if results else None
+    if anime:
+        random_window.add(window_key, anime.page_id)
+        embed = await render_anime_embed(anime)
         embed.title = f"🎲 Random: {embed.title.replace('🎬 ', '')}"
-        series_name = get_prop(page, "Loạt phim")
-        series_list = await get_series_list(series_name, ten_full)
+        series_name = anime.loat_phim
+        series_list = await get_series_list(series_name, anime.page_id)
         if series_list:
-             embed.description += f"\n**Cùng loạt phim:**\n" + "\n".join([f"• {n}" for n in series_list])
-        await interaction.followup.send(embed=embed, view=AnimeView(series_list))
+             embed.description += f"\n**Cùng loạt phim:**\n" + "\n".join([f"• {n}" for _, n in series_list])
+        with stage("send"):
+            await interaction.followup.send(embed=embed, view=AnimeView(series_list))
     else:
-        await interaction.followup.send("Kho phim trống!")
+        with stage("send"):
+            await interaction.followup.send("Kho phim trống!")
 
 @client.tree.command(name="mua", description="Xem phim theo mùa")
+@traced(SLOW_COMMAND_SECONDS)
 async def mua(interaction: discord.Interaction, ten_mua: str):
-    await interaction.response.defer()
+    with stage("defer"):
+        await interaction.response.defer()
     payload = {
         "filter": {
             "and": [
@@ -532,24 +1199,28 @@ async def mua(interaction: discord.Interaction, ten_mua: str):
         },
         "sorts": [{ "property": "Tên Romanji", "direction": "ascending" }]
     }
-    data = await fetch_notion(payload)
-    if data and data.get("results"):
-        results = data["results"]
-        page = results[0]
-        ten = get_prop(page, "Tên Romanji")
-        slug = create_slug_url(ten, page["id"])
-        link = f"{WEB_BASE_URL}/anime/{slug}"
-        embed = await create_anime_embed(page, link)
+    label = ten_mua
+    if catalog.ready:
+        # Index mùa/năm: "Xuân 2024", "2024", "2020-2022", "mới nhất"...
+        label, results = catalog.search_season(ten_mua)
+    else:
+        results = await search_anime(payload, lambda: [], site="mua")
+    if results:
+        anime = results[0]
+        embed = await render_anime_embed(anime)
         embed.set_footer(text=f"Phim thứ 1/{len(results)}")
-        await interaction.followup.send(embed=embed, view=AnimePaginationView(results))
+        view = pagination_view(save_results(results), 0, len(results))
+        with stage("send"):
+            await interaction.followup.send(content=f"📅 Mùa **{label}**: {len(results)} phim", embed=embed, view=view)
+        prefetch_ids([results[1].page_id] if len(results) > 1 and results[1] else [])
     else:
-        await interaction.followup.send(f"Không có phim nào mùa: {ten_mua}")
+        with stage("send"):
+            await interaction.followup.send(f"Không có phim nào mùa: {ten_mua}")
 
 # ==========================================
 # KHỞI CHẠY
 # ==========================================
 if __name__ == "__main__":
-    keep_alive()
     try:
         client.run(TOKEN)
     except Exception as e:
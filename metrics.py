@@ -0,0 +1,169 @@
+import bisect
+import contextvars
+import functools
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# ==========================================
+# METRIC KIỂU PROMETHEUS (không cần thư viện ngoài)
+# ==========================================
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs: return ""
+    body = ",".join(f'{k}="{str(v)}"' for k, v in pairs)
+    return "{" + body + "}"
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, doc, labels=()):
+        self.name = name
+        self.doc = doc
+        self.labels = tuple(labels)
+        self._values = defaultdict(float)
+
+    def inc(self, amount=1, **labels):
+        self._values[tuple(labels.get(n, "") for n in self.labels)] += amount
+
+    def samples(self):
+        for key, value in self._values.items():
+            yield self.name + _format_labels(self.labels, key), value
+
+class Gauge:
+    kind = "gauge"
+
+    def __init__(self, name, doc, labels=(), callback=None):
+        self.name = name
+        self.doc = doc
+        self.labels = tuple(labels)
+        self.callback = callback     # Tính giá trị lúc scrape: callback() -> {labels tuple: value}
+        self._values = {}
+
+    def set(self, value, **labels):
+        self._values[tuple(labels.get(n, "") for n in self.labels)] = value
+
+    def samples(self):
+        values = self.callback() if self.callback else self._values
+        for key, value in values.items():
+            yield self.name + _format_labels(self.labels, key), value
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name, doc, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.doc = doc
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._series = {}    # labels -> [số đếm theo bucket..., tổng, count]
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(n, "") for n in self.labels)
+        series = self._series.get(key)
+        if series is None:
+            series = [0] * (len(self.buckets) + 1) + [0.0, 0]
+            self._series[key] = series
+        series[bisect.bisect_left(self.buckets, value)] += 1
+        series[-2] += value
+        series[-1] += 1
+
+    def samples(self):
+        for key, series in self._series.items():
+            cumulative = 0
+            for i, bound in enumerate(self.buckets):
+                cumulative += series[i]
+                yield self.name + "_bucket" + _format_labels(self.labels, key, ("le", bound)), cumulative
+            yield self.name + "_bucket" + _format_labels(self.labels, key, ("le", "+Inf")), series[-1]
+            yield self.name + "_sum" + _format_labels(self.labels, key), series[-2]
+            yield self.name + "_count" + _format_labels(self.labels, key), series[-1]
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.doc}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for sample, value in metric.samples():
+                lines.append(f"{sample} {value}")
+        return "\n".join(lines) + "\n"
+
+REGISTRY = Registry()
+
+NOTION_LATENCY = REGISTRY.register(Histogram(
+    "notion_request_seconds", "Thời gian mỗi request Notion theo nơi gọi", labels=("site", "status")))
+COMMAND_LATENCY = REGISTRY.register(Histogram(
+    "command_seconds", "Thời gian xử lý lệnh slash (từ lúc Discord tạo interaction)", labels=("command",)))
+COMMAND_STAGE = REGISTRY.register(Histogram(
+    "command_stage_seconds", "Thời gian từng giai đoạn của lệnh", labels=("command", "stage")))
+POLL_DURATION = REGISTRY.register(Histogram(
+    "poll_seconds", "Thời gian một lượt check_new_anime", buckets=(0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)))
+POLL_PAGES = REGISTRY.register(Counter("poll_pages_total", "Số trang Notion quét được qua các lượt kiểm tra"))
+POLL_LAST_PAGES = REGISTRY.register(Gauge("poll_last_pages", "Số trang quét ở lượt kiểm tra gần nhất"))
+
+# ==========================================
+# ĐO THEO GIAI ĐOẠN CHO LỆNH (defer / notion / embed / send)
+# ==========================================
+_current_trace = contextvars.ContextVar("command_trace", default=None)
+
+class CommandTrace:
+    def __init__(self, name):
+        self.name = name
+        self.start = time.perf_counter()
+        self.stages = defaultdict(float)
+
+    def add(self, stage_name, seconds):
+        self.stages[stage_name] += seconds
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self.start
+
+    def summary(self):
+        parts = [f"{k}={v * 1000:.0f}ms" for k, v in self.stages.items()]
+        return f"/{self.name} {self.elapsed * 1000:.0f}ms ({', '.join(parts) or 'không có giai đoạn'})"
+
+@contextmanager
+def stage(name):
+    # Không trong lệnh nào (poller, prefetch...) thì chỉ chạy bình thường, không ghi
+    trace = _current_trace.get()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        if trace is not None:
+            trace.add(name, time.perf_counter() - start)
+
+async def untraced(coro):
+    # Task chạy nền (tải trước...) mang bản sao context của lệnh đã tạo ra nó:
+    # xoá trace trong bản sao đó để thời gian chạy nền không bị cộng vào lệnh
+    _current_trace.set(None)
+    return await coro
+
+def traced(slow_threshold=2.0):
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(interaction, *args, **kwargs):
+            trace = CommandTrace(func.__name__)
+            token = _current_trace.set(trace)
+            try:
+                return await func(interaction, *args, **kwargs)
+            finally:
+                _current_trace.reset(token)
+                for stage_name, seconds in trace.stages.items():
+                    COMMAND_STAGE.observe(seconds, command=trace.name, stage=stage_name)
+                if trace.elapsed >= slow_threshold:
+                    print(f"🐢 Lệnh chậm: {trace.summary()}")
+        return wrapper
+    return decorator
@@ -0,0 +1,341 @@
+import asyncio
+import heapq
+import itertools
+import random
+import time
+import aiohttp
+from datetime import datetime, timezone
+from metrics import NOTION_LATENCY
+
+NOTION_API_URL = "https://api.notion.com/v1"
+NOTION_VERSION = "2022-06-28"
+
+# Làn ưu tiên: số nhỏ được phục vụ trước
+PRIORITY_INTERACTIVE = 0   # Lệnh slash của người dùng
+PRIORITY_POLL = 1          # check_new_anime
+PRIORITY_SYNC = 2          # Đồng bộ catalog / lần chạy đầu
+
+class NotionError(Exception):
+    def __init__(self, status, message=""):
+        super().__init__(f"Lỗi API Notion {status}: {message}")
+        self.status = status
+
+def parse_retry_after(value):
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        return None
+
+# ==========================================
+# BỘ ĐIỀU PHỐI: TOKEN BUCKET + GIỚI HẠN SONG SONG + ƯU TIÊN
+# ==========================================
+class RequestScheduler:
+    def __init__(self, rate=3.0, burst=3, max_concurrency=3):
+        self.rate = rate
+        self.burst = burst
+        self.max_concurrency = max_concurrency
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0       # Notion trả 429 -> tạm dừng mọi làn
+        self._active = 0
+        self._queue = []                # heap (ưu tiên, thứ tự, future)
+        self._seq = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._dispatcher = None
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def _delay(self):
+        self._refill()
+        wait = self._blocked_until - time.monotonic()
+        if self._tokens < 1:
+            wait = max(wait, (1 - self._tokens) / self.rate)
+        return wait
+
+    async def _dispatch(self):
+        while True:
+            while self._queue and self._queue[0][2].done():
+                heapq.heappop(self._queue)  # Bỏ yêu cầu đã bị huỷ
+            if not self._queue or self._active >= self.max_concurrency:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            delay = self._delay()
+            if delay > 0:
+                # Ngủ xong xét lại đầu hàng đợi: yêu cầu ưu tiên cao tới sau vẫn được đi trước
+                await asyncio.sleep(delay)
+                continue
+            _, _, future = heapq.heappop(self._queue)
+            self._tokens -= 1
+            self._active += 1
+            future.set_result(None)
+
+    async def acquire(self, priority=PRIORITY_INTERACTIVE):
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = asyncio.get_running_loop().create_task(self._dispatch())
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._queue, (priority, next(self._seq), future))
+        self._wakeup.set()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self.release()
+            raise
+
+    def release(self):
+        self._active -= 1
+        self._wakeup.set()
+
+    def pause(self, seconds):
+        self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+
+    def close(self):
+        if self._dispatcher is not None:
+            self._dispatcher.cancel()
+            self._dispatcher = None
+
+# ==========================================
+# CLIENT NOTION DÙNG CHUNG (1 SESSION, GIỮ KẾT NỐI)
+# ==========================================
+class NotionClient:
+    def __init__(self, token, database_id, base_url=NOTION_API_URL,
+                 pool_limit=10, pool_limit_per_host=10, keepalive_timeout=60,
+                 dns_cache_ttl=300, total_timeout=30, connect_timeout=10,
+                 rate=3.0, burst=3, max_concurrency=3, max_retries=5,
+                 backoff_base=1.0, backoff_max=30.0):
+        self.token = token
+        self.database_id = database_id
+        self.base_url = base_url.rstrip("/")
+        self.pool_limit = pool_limit
+        self.pool_limit_per_host = pool_limit_per_host
+        self.keepalive_timeout = keepalive_timeout
+        self.dns_cache_ttl = dns_cache_ttl
+        self.timeout = aiohttp.ClientTimeout(total=total_timeout, connect=connect_timeout)
+        self.scheduler = RequestScheduler(rate=rate, burst=burst, max_concurrency=max_concurrency)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._session = None
+
+    @property
+    def query_url(self):
+        return f"{self.base_url}/databases/{self.database_id}/query"
+
+    @property
+    def headers(self):
+        return {
+            "Authorization": f"Bearer {self.token}",
+            "Notion-Version": NOTION_VERSION,
+            "Content-Type": "application/json"
+        }
+
+    async def start(self):
+        # Tạo session lười (lazy) để chắc chắn đang chạy trong event loop của bot
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.pool_limit,
+                limit_per_host=self.pool_limit_per_host,
+                keepalive_timeout=self.keepalive_timeout,
+                ttl_dns_cache=self.dns_cache_ttl,
+                use_dns_cache=True,
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector, timeout=self.timeout, headers=self.headers
+            )
+        return self._session
+
+    async def close(self):
+        self.scheduler.close()
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    def _backoff(self, attempt):
+        delay = min(self.backoff_max, self.backoff_base * (2 ** attempt))
+        return delay + random.uniform(0, delay / 2)
+
+    async def _request(self, method, url, payload=None, priority=PRIORITY_INTERACTIVE, site="other"):
+        # Thử lại khi 429/5xx/lỗi mạng; 429 tôn trọng Retry-After và chặn cả bộ điều phối
+        session = await self.start()
+        for attempt in range(self.max_retries + 1):
+            await self.scheduler.acquire(priority)
+            started = time.perf_counter()
+            status = "error"
+            try:
+                async with session.request(method, url, json=payload) as resp:
+                    status = resp.status
+                    if resp.status == 200:
+                        return await resp.json()
+                    body = await resp.text()
+                    if resp.status != 429 and resp.status < 500:
+                        raise NotionError(resp.status, body[:200])
+                    error = NotionError(resp.status, body[:200])
+                    delay = parse_retry_after(resp.headers.get("Retry-After"))
+                    if delay is None:
+                        delay = self._backoff(attempt)
+                    if resp.status == 429:
+                        self.scheduler.pause(delay)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                error = NotionError(0, str(e) or type(e).__name__)
+                delay = self._backoff(attempt)
+            finally:
+                self.scheduler.release()
+                NOTION_LATENCY.observe(time.perf_counter() - started, site=site, status=status)
+
+            if attempt == self.max_retries:
+                raise error
+            print(f"⏳ Notion lỗi {error.status}, thử lại sau {delay:.1f}s ({attempt + 1}/{self.max_retries})")
+            await asyncio.sleep(delay)
+
+    async def query(self, payload, priority=PRIORITY_INTERACTIVE, site="query"):
+        return await self._request("POST", self.query_url, payload, priority, site)
+
+    async def get_page(self, page_id, priority=PRIORITY_INTERACTIVE, site="get_page"):
+        try:
+            return await self._request("GET", f"{self.base_url}/pages/{page_id}", priority=priority, site=site)
+        except NotionError as e:
+            if e.status == 404:
+                return None
+            raise
+
+    async def iter_query(self, filter_payload=None, priority=PRIORITY_SYNC, site="query_all"):
+        # Duyệt cursor tuần tự, trả từng lô (tối đa 100 trang) ngay khi về
+        has_more = True
+        cursor = None
+        payload = { "page_size": 100 }
+        if filter_payload:
+            payload.update(filter_payload)
+
+        while has_more:
+            if cursor:
+                payload["start_cursor"] = cursor
+            data = await self._request("POST", self.query_url, payload, priority, site)
+            if data.get("results"):
+                yield data["results"]
+            has_more = data.get("has_more", False)
+            cursor = data.get("next_cursor")
+
+    async def query_all(self, filter_payload=None, priority=PRIORITY_SYNC, site="query_all"):
+        # Lỗi giữa chừng -> NotionError, không trả về danh sách thiếu
+        results = []
+        async for batch in self.iter_query(filter_payload, priority, site):
+            results.extend(batch)
+        return results
+
+    async def created_time_partitions(self, filter_payload=None, parts=4, priority=PRIORITY_SYNC, site="query_all"):
+        # Chia database thành các khoảng created_time rời nhau, từ trang cũ nhất tới hiện tại
+        probe = dict(filter_payload or {})
+        probe["page_size"] = 1
+        probe["sorts"] = [{ "timestamp": "created_time", "direction": "ascending" }]
+        data = await self._request("POST", self.query_url, probe, priority, site)
+        if not data.get("results"):
+            return []
+        oldest = datetime.fromisoformat(data["results"][0]["created_time"].replace("Z", "+00:00"))
+        newest = datetime.now(timezone.utc)
+        step = (newest - oldest) / parts
+        bounds = [(oldest + step * i).strftime("%Y-%m-%dT%H:%M:%S.000Z") for i in range(1, parts)]
+
+        partitions = []
+        for i in range(parts):
+            conditions = []
+            if i > 0:
+                conditions.append({ "timestamp": "created_time", "created_time": { "on_or_after": bounds[i - 1] } })
+            if i < parts - 1:
+                conditions.append({ "timestamp": "created_time", "created_time": { "before": bounds[i] } })
+            partitions.append(and_filter(filter_payload, conditions))
+        return partitions
+
+    async def query_partitioned(self, filter_payload=None, parts=4, priority=PRIORITY_SYNC, site="query_all"):
+        # Các phân vùng phân trang song song (vẫn qua bộ điều phối chung), lô nào về trước trả trước
+        if parts <= 1:
+            async for batch in self.iter_query(filter_payload, priority, site):
+                yield batch
+            return
+        partitions = await self.created_time_partitions(filter_payload, parts, priority, site)
+        if not partitions: return
+
+        # Hàng đợi có giới hạn: bên nhận xử lý chậm thì các phân vùng tự chờ, không dồn RAM
+        queue = asyncio.Queue(maxsize=len(partitions) * 2)
+        done = object()
+
+        async def walk(partition):
+            try:
+                async for batch in self.iter_query(partition, priority, site):
+                    await queue.put(batch)
+                await queue.put(done)
+            except Exception as e:
+                await queue.put(e)
+
+        tasks = [asyncio.create_task(walk(p)) for p in partitions]
+        remaining = len(tasks)
+        try:
+            while remaining:
+                item = await queue.get()
+                if item is done:
+                    remaining -= 1
+                elif isinstance(item, Exception):
+                    raise item
+                else:
+                    yield item
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+def and_filter(filter_payload, conditions):
+    # Ghép thêm điều kiện vào bộ lọc gốc, giữ 1 tầng "and" (Notion giới hạn độ sâu lồng nhau)
+    payload = dict(filter_payload or {})
+    base = payload.get("filter")
+    if not conditions:
+        return payload
+    if base is None:
+        clauses = []
+    elif "and" in base:
+        clauses = list(base["and"])
+    else:
+        clauses = [base]
+    clauses.extend(conditions)
+    payload["filter"] = clauses[0] if len(clauses) == 1 else { "and": clauses }
+    return payload
+
+def get_prop(page, prop_name):
+    props = page.get("properties", {})
+    prop = props.get(prop_name)
+    if not prop: return "N/A"
+    ptype = prop.get("type")
+    
+    if ptype == "title":
+        return prop["title"][0]["plain_text"] if prop["title"] else "Không tên"
+    elif ptype == "rich_text":
+        return prop["rich_text"][0]["plain_text"] if prop["rich_text"] else "Không có"
+    elif ptype == "number":
+        return str(prop["number"]) if prop["number"] is not None else "?"
+    elif ptype == "select":
+        return prop["select"]["name"] if prop["select"] else "Không rõ"
+    elif ptype == "multi_select":
+        return ", ".join([o['name'] for o in prop['multi_select']]) if prop['multi_select'] else "Không rõ"
+    elif ptype == "status":
+        return prop["status"]["name"] if prop["status"] else "Không rõ"
+    elif ptype == "url":
+        return prop["url"] if prop["url"] else None
+    elif ptype == "checkbox":
+        return prop["checkbox"]
+    elif ptype == "files":
+        if prop["files"]:
+            file_obj = prop["files"][0]
+            if "file" in file_obj: return file_obj["file"]["url"]
+            if "external" in file_obj: return file_obj["external"]["url"]
+    elif ptype == "date":
+        return prop["date"]["start"] if prop["date"] else None
+    return "N/A"
+
+def get_file_expiry(page, prop_name):
+    # File do Notion lưu là URL ký sẵn, hết hạn sau ~1 giờ; link ngoài (external) thì không hết hạn
+    prop = page.get("properties", {}).get(prop_name)
+    if not prop or prop.get("type") != "files" or not prop["files"]:
+        return None
+    return prop["files"][0].get("file", {}).get("expiry_time")
@@ -0,0 +1,135 @@
+import asyncio
+import json
+import time
+from collections import OrderedDict
+
+# ==========================================
+# CACHE KẾT QUẢ TRUY VẤN NOTION (TTL + LRU + GỘP YÊU CẦU TRÙNG)
+# ==========================================
+class QueryCache:
+    def __init__(self, ttl=60, max_entries=256):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()   # key -> (hết hạn lúc, kết quả, {page_id})
+        self._inflight = {}             # key -> Future của yêu cầu đang chạy
+        self._generation = 0            # tăng mỗi lần invalidate
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    @staticmethod
+    def make_key(payload):
+        # Chuẩn hoá payload: cùng nội dung -> cùng khoá, bất kể thứ tự trường
+        return json.dumps(payload, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+
+    async def get_or_fetch(self, payload, fetch):
+        key = self.make_key(payload)
+        entry = self._entries.get(key)
+        if entry is not None:
+            if entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            del self._entries[key]
+
+        # Đã có yêu cầu giống hệt đang chạy -> chờ chung kết quả
+        pending = self._inflight.get(key)
+        if pending is not None:
+            self.coalesced += 1
+            try:
+                return await asyncio.shield(pending)
+            except asyncio.CancelledError:
+                # Yêu cầu dẫn đầu bị huỷ chứ không phải mình -> tự tải lại
+                if not pending.cancelled(): raise
+                return await self.get_or_fetch(payload, fetch)
+
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        generation = self._generation
+        try:
+            result = await fetch(payload)
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # Đánh dấu đã đọc để không cảnh báo khi không ai chờ
+            raise
+        else:
+            future.set_result(result)
+            # Trang đổi trong lúc đang tải -> không lưu kết quả có thể đã cũ
+            if result is not None and generation == self._generation:
+                self._store(key, result)
+            return result
+        finally:
+            # CancelledError không phải Exception: huỷ future để các yêu cầu đang chờ không treo mãi
+            if not future.done():
+                future.cancel()
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+
+    def _store(self, key, result):
+        page_ids = {p["id"] for p in result.get("results", [])} if isinstance(result, dict) else set()
+        self._entries[key] = (time.monotonic() + self.ttl, result, page_ids)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def invalidate_pages(self, page_ids):
+        page_ids = set(page_ids)
+        if not page_ids: return
+        self._generation += 1
+        stale = [key for key, entry in self._entries.items() if entry[2] & page_ids]
+        for key in stale:
+            del self._entries[key]
+
+    def clear(self):
+        self._generation += 1
+        self._entries.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses + self.coalesced
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "hit_rate": (self.hits + self.coalesced) / lookups if lookups else 0.0,
+        }
+
+def _copy_embed(embed):
+    # Embed.copy() biến description "" thành None, mà nơi gọi dùng description += ...
+    copy = embed.copy()
+    if embed.description == "":
+        copy.description = ""
+    return copy
+
+# ==========================================
+# CACHE EMBED ĐÃ DỰNG (LRU, khoá gồm page_id + last_edited_time)
+# ==========================================
+class RenderCache:
+    def __init__(self, max_entries=512):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        value = self._entries.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        # Trả bản sao: nơi gọi còn sửa title/footer/description
+        return _copy_embed(value)
+
+    def put(self, key, value):
+        self._entries[key] = _copy_embed(value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
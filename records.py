@@ -0,0 +1,106 @@
+from datetime import datetime, timedelta, timezone
+from operator import attrgetter
+from notion_api import get_prop, get_file_expiry
+
+VN_TZ = timezone(timedelta(hours=7))
+
+# ==========================================
+# XỬ LÝ NGÀY -> EPOCH (giây)
+# ==========================================
+def parse_notion_time(value):
+    # last_edited_time / created_time của Notion (UTC, ISO 8601)
+    if not value: return None
+    try:
+        return int(datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp())
+    except ValueError:
+        return None
+
+def parse_user_date(value):
+    # "Ngày cập nhật" do người dùng nhập, mặc định giờ VN (UTC+7)
+    if not value: return None
+    try:
+        user_date = datetime.strptime(value, "%B %d, %Y %H:%M").replace(tzinfo=VN_TZ)
+    except ValueError:
+        if "T" not in value:
+            return None
+        try:
+            user_date = datetime.fromisoformat(value)
+        except ValueError as e:
+            print(f"⚠️ Lỗi đọc ngày: {e}")
+            return None
+        if user_date.tzinfo is None:
+            user_date = user_date.replace(tzinfo=VN_TZ)
+    return int(user_date.timestamp())
+
+# ==========================================
+# ANIME RECORD: ĐỌC JSON NOTION 1 LẦN, CHỈ GIỮ TRƯỜNG BOT DÙNG
+# ==========================================
+class AnimeRecord:
+    __slots__ = (
+        "page_id", "public",
+        "ten_romanji", "ten_tieng_anh", "so_tap_sub", "so_tap", "nam",
+        "link_tai", "anh_bia", "tom_tat", "trang_thai", "nhom_dich", "loat_phim",
+        "ngay_cap_nhat", "updated_at", "last_edited", "last_edited_at", "anh_bia_expires",
+    )
+
+    def __init__(self, page_id, public=True, ten_romanji="Không tên", ten_tieng_anh="Không có",
+                 so_tap_sub="?", so_tap="?", nam="Không có", link_tai=None, anh_bia="N/A",
+                 tom_tat="Không có", trang_thai="Không rõ", nhom_dich="N/A", loat_phim="Không có",
+                 ngay_cap_nhat=None, last_edited=None, anh_bia_expiry=None):
+        self.page_id = page_id
+        self.public = public
+        self.ten_romanji = ten_romanji
+        self.ten_tieng_anh = ten_tieng_anh
+        self.so_tap_sub = so_tap_sub
+        self.so_tap = so_tap
+        self.nam = nam
+        self.link_tai = link_tai
+        self.anh_bia = anh_bia
+        self.tom_tat = tom_tat
+        self.trang_thai = trang_thai
+        self.nhom_dich = nhom_dich
+        self.loat_phim = loat_phim
+        self.ngay_cap_nhat = ngay_cap_nhat
+        self.updated_at = parse_user_date(ngay_cap_nhat)
+        self.last_edited = last_edited
+        self.last_edited_at = parse_notion_time(last_edited)
+        self.anh_bia_expires = parse_notion_time(anh_bia_expiry)   # None = link không hết hạn
+
+    @classmethod
+    def from_page(cls, page):
+        # Giữ nguyên giá trị mặc định của get_prop ("Không có", "N/A"...) để embed hiển thị như cũ
+        return cls(
+            page["id"],
+            public=not page.get("archived") and get_prop(page, "Public") is True,
+            ten_romanji=get_prop(page, "Tên Romanji"),
+            ten_tieng_anh=get_prop(page, "Tên tiếng Anh"),
+            so_tap_sub=get_prop(page, "Số tập Vietsub"),
+            so_tap=get_prop(page, "Số tập"),
+            nam=get_prop(page, "Năm"),
+            link_tai=get_prop(page, "Tải xuống phụ đề"),
+            anh_bia=get_prop(page, "Ảnh"),
+            tom_tat=get_prop(page, "Tóm tắt nội dung"),
+            trang_thai=get_prop(page, "Trạng thái"),
+            nhom_dich=get_prop(page, "Bản quyền/Nhóm dịch"),
+            loat_phim=get_prop(page, "Loạt phim"),
+            ngay_cap_nhat=get_prop(page, "Ngày cập nhật"),
+            last_edited=page.get("last_edited_time"),
+            anh_bia_expiry=get_file_expiry(page, "Ảnh"),
+        )
+
+    def to_tuple(self):
+        # Dạng gọn cho snapshot: giá trị các slot theo thứ tự
+        return _slot_values(self)
+
+    @classmethod
+    def from_tuple(cls, values):
+        # Dựng lại từ snapshot, không phải đọc lại ngày tháng
+        anime = cls.__new__(cls)
+        for name, value in zip(cls.__slots__, values):
+            setattr(anime, name, value)
+        return anime
+
+    def __repr__(self):
+        return f"<AnimeRecord {self.page_id} {self.ten_romanji!r}>"
+
+_slot_values = attrgetter(*AnimeRecord.__slots__)
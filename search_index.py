@@ -0,0 +1,433 @@
+import bisect
+import heapq
+import math
+import re
+import unicodedata
+from collections import Counter, defaultdict
+
+# Giá trị mặc định get_prop trả về khi trường trống -> không đưa vào index
+EMPTY_VALUES = {"N/A", "Không có", "Không tên", "Không rõ", "?"}
+
+# ==========================================
+# CHUẨN HOÁ CHUỖI (Bỏ dấu tiếng Việt)
+# ==========================================
+def fold_ascii(value):
+    # Cùng cách bỏ dấu với create_slug_url
+    return unicodedata.normalize('NFKD', str(value)).encode('ascii', 'ignore').decode('ascii')
+
+PUNCTUATION = re.compile(r'[^\w\s]')
+SPACES = re.compile(r'\s+')
+
+def normalize_title(value):
+    # "đ" không tách dấu được bằng NFKD -> đổi tay trước khi bỏ dấu
+    value = str(value).replace("đ", "d").replace("Đ", "D")
+    value = fold_ascii(value).lower()
+    value = PUNCTUATION.sub(' ', value)
+    return SPACES.sub(' ', value).strip()
+
+def trigrams(text, pad=True):
+    # Tên trong index được đệm khoảng trắng để bắt cả đầu/cuối từ;
+    # từ khoá tìm kiếm thì không, vì có thể nằm giữa tên
+    padded = f"  {text} " if pad else text
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+def substring_distance(query, text, max_dist):
+    # Levenshtein "nửa toàn cục": khoảng cách nhỏ nhất giữa query và một đoạn bất kỳ của text.
+    # So sánh tay thay cho min(a, b, c): vòng trong chạy hàng trăm lần mỗi ứng viên
+    prev = [0] * (len(text) + 1)
+    for i, qc in enumerate(query, 1):
+        cur = [i]
+        left = i
+        row_min = i
+        for j, tc in enumerate(text):
+            best = prev[j] if qc == tc else prev[j] + 1
+            if prev[j + 1] + 1 < best: best = prev[j + 1] + 1
+            if left + 1 < best: best = left + 1
+            cur.append(best)
+            left = best
+            if best < row_min: row_min = best
+        if row_min > max_dist:
+            return max_dist + 1
+        prev = cur
+    return min(prev)
+
+def max_typos(query):
+    if len(query) < 4: return 0
+    if len(query) < 8: return 1
+    return 2
+
+# ==========================================
+# INDEX TÊN PHIM (Trigram + khoảng cách sửa)
+# ==========================================
+NO_IDS = frozenset()
+
+class TitleIndex:
+    def __init__(self, max_candidates=20, max_scan=200):
+        self.keys = {}                  # page_id -> tuple tên đã chuẩn hoá
+        self.grams = defaultdict(set)   # trigram -> {page_id}
+        self.by_length = defaultdict(dict)  # độ dài tên -> {page_id: tên}: xếp hạng tên ngắn trước mà không duyệt hết
+        self._sorted = []               # [(tên, page_id)] đã sắp xếp: tên bắt đầu bằng từ khoá nằm liền nhau
+        self.max_candidates = max_candidates
+        self.max_scan = max_scan        # Trigram phổ biến hơn ngưỡng này không dùng để sinh ứng viên gần đúng
+
+    def __len__(self):
+        return len(self.keys)
+
+    def add(self, page_id, titles, defer=False):
+        # defer: dựng hàng loạt -> chỉ nối vào cuối, gọi finish() để sắp xếp 1 lần
+        self.remove(page_id)
+        keys = tuple(k for k in (normalize_title(t) for t in titles if t and t not in EMPTY_VALUES) if k)
+        if not keys: return
+        self.keys[page_id] = keys
+        for key in keys:
+            bucket = self.by_length[len(key)]
+            # Hai tên cùng độ dài: nối bằng "\n" (từ khoá không chứa "\n" nên vẫn dò "in" được)
+            bucket[page_id] = f"{bucket[page_id]}\n{key}" if page_id in bucket else key
+            if defer:
+                self._sorted.append((key, page_id))
+            else:
+                bisect.insort(self._sorted, (key, page_id))
+            for gram in trigrams(key):
+                self.grams[gram].add(page_id)
+
+    def finish(self):
+        self._sorted.sort()
+
+    def remove(self, page_id):
+        keys = self.keys.pop(page_id, None)
+        if not keys: return
+        for key in keys:
+            bucket = self.by_length.get(len(key))
+            if bucket is not None:
+                bucket.pop(page_id, None)
+                if not bucket:
+                    del self.by_length[len(key)]
+            i = bisect.bisect_left(self._sorted, (key, page_id))
+            if i < len(self._sorted) and self._sorted[i] == (key, page_id):
+                del self._sorted[i]
+            for gram in trigrams(key):
+                ids = self.grams.get(gram)
+                if ids is None: continue
+                ids.discard(page_id)
+                if not ids:
+                    del self.grams[gram]
+
+    def clear(self):
+        self.keys.clear()
+        self.grams.clear()
+        self.by_length.clear()
+        self._sorted = []
+
+    def search(self, query, limit=10):
+        # Từ khoá dưới 3 ký tự không có trigram: Catalog chuyển sang PrefixIndex
+        q = normalize_title(query)
+        q_grams = trigrams(q, pad=False)
+        if not q_grams: return []
+        # Tập page_id của từng trigram, hiếm nhất trước: giao/hợp bắt đầu từ tập nhỏ
+        postings = sorted((self.grams.get(gram, NO_IDS) for gram in q_grams), key=len)
+
+        # Khớp chính xác cần đủ mọi trigram -> giao các tập (chạy trong C, theo tập nhỏ nhất)
+        exact = postings[0]
+        for ids in postings[1:]:
+            if not exact: break
+            exact = exact & ids
+        if exact:
+            found = self._rank_exact(q, exact, limit)
+            if found: return found
+
+        # Không có kết quả chính xác mới tìm gần đúng. Mỗi lỗi gõ làm hỏng tối đa 3 trigram, nên tên
+        # cách <= allowed lỗi thiếu tối đa 3*allowed trong số trigram được đếm. Chỉ đếm các trigram
+        # hiếm: luôn giữ 3*allowed + 1 tập nhỏ nhất (ứng viên chắc chắn nằm trong một trong số đó),
+        # bỏ các trigram phổ biến hơn max_scan phim vì chúng gần như không phân biệt được gì
+        allowed = max_typos(q)
+        if not allowed: return []
+        ranked = []
+        keep = 3 * allowed + 1
+        while keep < len(postings) and len(postings[keep]) <= self.max_scan:
+            keep += 1
+        counted = postings[:keep]
+        min_overlap = max(1, len(counted) - 3 * allowed)
+        overlap = Counter()
+        for ids in counted:
+            overlap.update(ids)
+        fuzzy = [(hits, page_id) for page_id, hits in overlap.items() if hits >= min_overlap]
+        if len(fuzzy) > self.max_candidates:
+            # Nhiều ứng viên hoà điểm: cộng thêm trigram phổ biến, nhưng chỉ cho max_scan ứng viên tốt nhất
+            rest = postings[keep:]
+            fuzzy = [
+                (hits + sum(1 for ids in rest if page_id in ids), page_id)
+                for hits, page_id in heapq.nlargest(self.max_scan, fuzzy)
+            ]
+
+        # Chỉ tính khoảng cách sửa cho các ứng viên trùng trigram nhiều nhất
+        for hits, page_id in heapq.nlargest(self.max_candidates, fuzzy):
+            # Tên ngắn hơn từ khoá quá allowed ký tự thì không thể khớp
+            dist = min((substring_distance(q, key, allowed) for key in self.keys[page_id]
+                        if len(key) + allowed >= len(q)), default=allowed + 1)
+            if dist <= allowed:
+                # Hoà điểm thì tên ngắn hơn (gần từ khoá hơn) lên trước
+                ranked.append(((dist, -hits, min(len(key) for key in self.keys[page_id])), page_id))
+        ranked.sort()
+        return [page_id for _, page_id in ranked[:limit]]
+
+    def _rank_exact(self, q, exact, limit):
+        # Thứ hạng: tên bắt đầu bằng từ khoá trước, rồi tên chứa từ khoá; mỗi nhóm tên ngắn trước.
+        # Không xếp hạng cả tập (từ phổ biến khớp hàng nghìn phim) mà lấy thẳng theo thứ tự đó
+        starts = {}
+        i = bisect.bisect_left(self._sorted, (q,))
+        while i < len(self._sorted):
+            key, page_id = self._sorted[i]
+            if not key.startswith(q): break
+            if page_id not in starts or len(key) < starts[page_id]:
+                starts[page_id] = len(key)
+            i += 1
+        found = [page_id for _, page_id in heapq.nsmallest(limit, ((n, pid) for pid, n in starts.items()))]
+        if len(found) >= limit: return found
+
+        # Tên chứa từ khoá ở giữa: duyệt theo độ dài tăng dần, dừng khi đủ
+        for length in sorted(n for n in self.by_length if n > len(q)):
+            bucket = self.by_length[length]
+            for page_id in sorted(bucket.keys() & exact):
+                if page_id in starts: continue
+                if q in bucket[page_id]:
+                    found.append(page_id)
+                    starts[page_id] = length
+                    if len(found) >= limit: return found
+        return found
+
+# ==========================================
+# INDEX TIỀN TỐ (Autocomplete: mảng đã sắp xếp + bisect)
+# ==========================================
+class PrefixIndex:
+    def __init__(self):
+        self._keys = []      # [(đoạn tên từ đầu một từ, page_id)] đã sắp xếp
+        self._key_of = {}    # page_id -> các phần tử trong _keys
+
+    def __len__(self):
+        return len(self._key_of)
+
+    @staticmethod
+    def _suffixes(title):
+        # "shingeki no kyojin" -> "shingeki no kyojin", "no kyojin", "kyojin"
+        words = title.split()
+        return {" ".join(words[i:]) for i in range(len(words))}
+
+    def add(self, page_id, titles, defer=False):
+        # defer: dựng hàng loạt -> chỉ nối vào cuối, gọi finish() để sắp xếp 1 lần
+        self.remove(page_id)
+        keys = set()
+        for title in titles:
+            if not title or title in EMPTY_VALUES: continue
+            for suffix in self._suffixes(normalize_title(title)):
+                keys.add((suffix, page_id))
+        if defer:
+            self._keys.extend(keys)
+        else:
+            for key in keys:
+                bisect.insort(self._keys, key)
+        if keys:
+            self._key_of[page_id] = keys
+
+    def finish(self):
+        self._keys.sort()
+
+    def remove(self, page_id):
+        for key in self._key_of.pop(page_id, ()):
+            i = bisect.bisect_left(self._keys, key)
+            if i < len(self._keys) and self._keys[i] == key:
+                del self._keys[i]
+
+    def clear(self):
+        self._keys = []
+        self._key_of = {}
+
+    def search(self, prefix, limit=25):
+        q = normalize_title(prefix)
+        if not q: return []
+        found = []
+        seen = set()
+        i = bisect.bisect_left(self._keys, (q,))
+        while i < len(self._keys) and len(found) < limit:
+            key, page_id = self._keys[i]
+            if not key.startswith(q): break
+            if page_id not in seen:
+                seen.add(page_id)
+                found.append(page_id)
+            i += 1
+        return found
+
+# ==========================================
+# INDEX MÙA/NĂM ("Năm" -> (năm, mùa) đã sắp xếp)
+# ==========================================
+SEASON_WORDS = {
+    "dong": 1, "winter": 1,
+    "xuan": 2, "spring": 2,
+    "ha": 3, "he": 3, "summer": 3,
+    "thu": 4, "fall": 4, "autumn": 4,
+}
+SEASON_NAMES = {1: "Đông", 2: "Xuân", 3: "Hạ", 4: "Thu"}
+LATEST_WORDS = {"moi nhat", "latest", "gan nhat", "moi"}
+
+def parse_season(value):
+    # "Mùa Xuân 2024" / "Spring 2024" -> (2024, 2); "2024" -> (2024, 0); không đọc được -> None
+    text = normalize_title(value)
+    years = re.findall(r'\b(19\d{2}|20\d{2})\b', text)
+    if not years: return None
+    season = 0
+    for word in text.split():
+        if word in SEASON_WORDS:
+            season = SEASON_WORDS[word]
+            break
+    return (int(years[0]), season)
+
+def format_season(key):
+    year, season = key
+    return f"{SEASON_NAMES[season]} {year}" if season else str(year)
+
+class SeasonIndex:
+    def __init__(self):
+        self._keys = []      # [(năm, mùa, tên chuẩn hoá, page_id)] đã sắp xếp
+        self._key_of = {}    # page_id -> phần tử trong _keys
+
+    def __len__(self):
+        return len(self._keys)
+
+    def add(self, page_id, nam, title, defer=False):
+        self.remove(page_id)
+        parsed = parse_season(nam)
+        if parsed is None: return
+        key = (parsed[0], parsed[1], normalize_title(title), page_id)
+        if defer:
+            self._keys.append(key)
+        else:
+            bisect.insort(self._keys, key)
+        self._key_of[page_id] = key
+
+    def finish(self):
+        self._keys.sort()
+
+    def remove(self, page_id):
+        key = self._key_of.pop(page_id, None)
+        if key is None: return
+        i = bisect.bisect_left(self._keys, key)
+        if i < len(self._keys) and self._keys[i] == key:
+            del self._keys[i]
+
+    def clear(self):
+        self._keys = []
+        self._key_of = {}
+
+    def range(self, lo, hi):
+        # Các page_id có lo <= (năm, mùa) <= hi, theo thứ tự mùa rồi tên
+        start = bisect.bisect_left(self._keys, (lo[0], lo[1]))
+        end = bisect.bisect_right(self._keys, (hi[0], hi[1], "\uffff"))
+        return [key[3] for key in self._keys[start:end]]
+
+    def latest(self):
+        # Mùa mới nhất có ghi rõ mùa (bỏ qua các phim chỉ ghi năm)
+        for key in reversed(self._keys):
+            if key[1]:
+                return (key[0], key[1])
+        return (self._keys[-1][0], 0) if self._keys else None
+
+    def query(self, text):
+        # Trả về (nhãn, [page_id]) hoặc None nếu không hiểu được từ khoá
+        folded = normalize_title(text)
+        if folded in LATEST_WORDS:
+            key = self.latest()
+            if key is None: return None
+            return format_season(key), self.range(key, key)
+        span = re.fullmatch(r'(19\d{2}|20\d{2})\s*(?:-|den|to)?\s*(19\d{2}|20\d{2})', folded)
+        if span:
+            lo, hi = sorted((int(span.group(1)), int(span.group(2))))
+            return f"{lo}-{hi}", self.range((lo, 0), (hi, 4))
+        parsed = parse_season(text)
+        if parsed is None: return None
+        if parsed[1] == 0:
+            return str(parsed[0]), self.range((parsed[0], 0), (parsed[0], 4))
+        return format_season(parsed), self.range(parsed, parsed)
+
+# ==========================================
+# INDEX TOÀN VĂN (BM25 trên tóm tắt + tên + loạt phim + nhóm dịch)
+# ==========================================
+# Từ phổ biến gần như câu nào cũng có -> không giúp xếp hạng. So trên chữ CÒN DẤU:
+# bỏ dấu rồi mới lọc thì "bí"/"bị", "chó"/"cho", "khổng"/"không" thành một và mất từ thật.
+# Không có "a", "an", "to", "in", "on", "the"... vì trùng âm tiết tiếng Việt; IDF của BM25 tự hạ trọng số.
+STOP_WORDS = {
+    "và", "của", "là", "một", "những", "các", "với", "trong", "cho", "được", "có", "không",
+    "này", "đó", "do", "đến", "từ", "khi", "thì", "mà", "đã", "sẽ", "đang", "bị", "về", "ra", "vào",
+    "cũng", "lại", "như", "để", "ở", "tại", "hơn", "nhất", "rất",
+    "and", "of", "is", "about", "with", "for", "by",
+}
+
+def text_terms(value):
+    # Tách từ trên chữ thường còn dấu (NFC để dấu không bị tách khỏi chữ), lọc từ dừng, rồi mới bỏ dấu.
+    # Tiếng Việt viết tách âm tiết: giữ cả từng âm tiết lẫn cặp âm tiết liền nhau
+    # ("du hanh thoi gian" -> "thoi gian") để cụm từ ghép được xếp hạng cao hơn
+    text = PUNCTUATION.sub(' ', unicodedata.normalize('NFC', str(value)).lower())
+    words = normalize_title(" ".join(w for w in text.split() if w not in STOP_WORDS)).split()
+    return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+class TextIndex:
+    def __init__(self, k1=1.2, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.postings = defaultdict(dict)   # term -> {page_id: tần suất đã nhân trọng số}
+        self.doc_len = {}                   # page_id -> (độ dài có trọng số, các term)
+        self.total_len = 0
+        self._norms = None                  # page_id -> k1 * (1 - b + b * dl / avgdl), tính lại khi đổi
+
+    def __len__(self):
+        return len(self.doc_len)
+
+    def add(self, page_id, fields):
+        # fields: [(văn bản, trọng số)] - tên phim nặng hơn tóm tắt
+        self.remove(page_id)
+        counts = Counter()
+        for text, weight in fields:
+            if not text or text in EMPTY_VALUES: continue
+            for term in text_terms(text):
+                counts[term] += weight
+        if not counts: return
+        for term, tf in counts.items():
+            self.postings[term][page_id] = tf
+        length = sum(counts.values())
+        self.doc_len[page_id] = (length, tuple(counts))
+        self.total_len += length
+        self._norms = None
+
+    def remove(self, page_id):
+        entry = self.doc_len.pop(page_id, None)
+        if entry is None: return
+        length, terms = entry
+        self.total_len -= length
+        self._norms = None
+        for term in terms:
+            docs = self.postings.get(term)
+            if docs is None: continue
+            docs.pop(page_id, None)
+            if not docs:
+                del self.postings[term]
+
+    def clear(self):
+        self.postings.clear()
+        self.doc_len.clear()
+        self.total_len = 0
+        self._norms = None
+
+    def search(self, query, limit=25):
+        # Trả về [(page_id, điểm)] theo điểm BM25 giảm dần
+        n = len(self.doc_len)
+        if not n: return []
+        norms = self._norms
+        if norms is None:
+            k1, b, avg_len = self.k1, self.b, self.total_len / n
+            norms = self._norms = {pid: k1 * (1 - b + b * entry[0] / avg_len) for pid, entry in self.doc_len.items()}
+        scores = defaultdict(float)
+        for term in set(text_terms(query)):
+            docs = self.postings.get(term)
+            if not docs: continue
+            weight = math.log(1 + (n - len(docs) + 0.5) / (len(docs) + 0.5)) * (self.k1 + 1)
+            for page_id, tf in docs.items():
+                scores[page_id] += weight * tf / (tf + norms[page_id])
+        return heapq.nlargest(limit, scores.items(), key=lambda item: item[1])
@@ -0,0 +1,173 @@
+import hashlib
+import json
+import os
+import sqlite3
+import time
+
+# ==========================================
+# KHO TRẠNG THÁI CỤC BỘ (SQLite WAL)
+# ==========================================
+class NotifyStore:
+    def __init__(self, path="bot_state.db"):
+        self.path = path
+        # isolation_level=None: tự quản lý transaction bằng BEGIN/COMMIT
+        self._conn = sqlite3.connect(path, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS notified (page_id TEXT PRIMARY KEY, update_date TEXT NOT NULL)"
+        )
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS lease (name TEXT PRIMARY KEY, holder TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS covers (page_id TEXT PRIMARY KEY, source TEXT NOT NULL, file TEXT NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS result_sets (handle TEXT PRIMARY KEY, page_ids TEXT NOT NULL, created_at REAL NOT NULL)"
+        )
+        self.reload()
+
+    def reload(self):
+        # Giữ bản sao trong bộ nhớ, không đọc lại đĩa mỗi lượt kiểm tra.
+        # Nhiều tiến trình dùng chung file: gọi lại khi vừa nhận quyền ghi (leader).
+        self._dates = dict(self._conn.execute("SELECT page_id, update_date FROM notified"))
+        self._meta = dict(self._conn.execute("SELECT key, value FROM meta"))
+
+    def __len__(self):
+        return len(self._dates)
+
+    def __contains__(self, page_id):
+        return page_id in self._dates
+
+    def get(self, page_id):
+        return self._dates.get(page_id)
+
+    def upsert_many(self, items):
+        # Ghi cả lô trong 1 transaction: hoặc đủ cả, hoặc không gì cả
+        items = dict(items)
+        if not items: return
+        with self._transaction():
+            self._conn.executemany(
+                "INSERT INTO notified (page_id, update_date) VALUES (?, ?) "
+                "ON CONFLICT(page_id) DO UPDATE SET update_date = excluded.update_date",
+                items.items(),
+            )
+        self._dates.update(items)
+
+    def set(self, page_id, update_date):
+        self.upsert_many({ page_id: update_date })
+
+    def get_meta(self, key, default=None):
+        return self._meta.get(key, default)
+
+    def set_meta(self, key, value):
+        with self._transaction():
+            self._conn.execute(
+                "INSERT INTO meta (key, value) VALUES (?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+                (key, value),
+            )
+        self._meta[key] = value
+
+    # --- LEASE: CHỈ 1 TIẾN TRÌNH GIỮ VAI TRÒ LEADER ---
+    def acquire_lease(self, name, holder, ttl):
+        # Lấy hoặc gia hạn lease nếu đang trống, đã hết hạn hay vốn là của mình
+        now = time.time()
+        with self._transaction():
+            row = self._conn.execute("SELECT holder, expires_at FROM lease WHERE name = ?", (name,)).fetchone()
+            if row is not None and row[0] != holder and row[1] > now:
+                return False
+            self._conn.execute(
+                "INSERT INTO lease (name, holder, expires_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(name) DO UPDATE SET holder = excluded.holder, expires_at = excluded.expires_at",
+                (name, holder, now + ttl),
+            )
+        return True
+
+    def release_lease(self, name, holder):
+        with self._transaction():
+            self._conn.execute("DELETE FROM lease WHERE name = ? AND holder = ?", (name, holder))
+
+    def lease_holder(self, name):
+        row = self._conn.execute("SELECT holder, expires_at FROM lease WHERE name = ?", (name,)).fetchone()
+        if row is None or row[1] <= time.time():
+            return None
+        return row[0]
+
+    # --- ẢNH BÌA ĐÃ SAO LƯU: page_id -> (nguồn, tên file theo hash nội dung) ---
+    def load_covers(self):
+        return { page_id: (source, name) for page_id, source, name in self._conn.execute("SELECT page_id, source, file FROM covers") }
+
+    def set_cover(self, page_id, source, name):
+        with self._transaction():
+            self._conn.execute(
+                "INSERT INTO covers (page_id, source, file) VALUES (?, ?, ?) "
+                "ON CONFLICT(page_id) DO UPDATE SET source = excluded.source, file = excluded.file",
+                (page_id, source, name),
+            )
+
+    # --- DANH SÁCH KẾT QUẢ CHO VIEW: custom_id chỉ mang handle ngắn ---
+    def save_result_set(self, page_ids):
+        # Băm theo nội dung: cùng danh sách -> cùng handle, không lưu trùng
+        joined = ",".join(page_ids)
+        handle = hashlib.blake2b(joined.encode(), digest_size=8).hexdigest()
+        with self._transaction():
+            self._conn.execute(
+                "INSERT INTO result_sets (handle, page_ids, created_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(handle) DO UPDATE SET created_at = excluded.created_at",
+                (handle, joined, time.time()),
+            )
+        return handle
+
+    def load_result_set(self, handle):
+        row = self._conn.execute("SELECT page_ids FROM result_sets WHERE handle = ?", (handle,)).fetchone()
+        if row is None: return None
+        return row[0].split(",") if row[0] else []
+
+    def prune_result_sets(self, max_age):
+        with self._transaction():
+            cur = self._conn.execute("DELETE FROM result_sets WHERE created_at < ?", (time.time() - max_age,))
+        return cur.rowcount
+
+    def _transaction(self):
+        return _Transaction(self._conn)
+
+    def migrate_json(self, cache_file, poll_state_file=None):
+        # Chuyển dữ liệu từ cache.json / poll_state.json cũ sang SQLite (chỉ 1 lần)
+        if self._dates or not os.path.exists(cache_file):
+            return False
+        try:
+            with open(cache_file, "r", encoding="utf-8") as f:
+                legacy = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"⚠️ Không đọc được {cache_file}, bỏ qua chuyển đổi: {e}")
+            return False
+        self.upsert_many(legacy)
+        if poll_state_file and os.path.exists(poll_state_file):
+            try:
+                with open(poll_state_file, "r", encoding="utf-8") as f:
+                    watermark = json.load(f).get("watermark")
+                if watermark:
+                    self.set_meta("poll_watermark", watermark)
+            except (OSError, ValueError):
+                pass
+        self.set_meta("initialized", "1")
+        print(f"📦 Đã chuyển {len(legacy)} mục từ {cache_file} sang {self.path}.")
+        return True
+
+    def close(self):
+        self._conn.close()
+
+class _Transaction:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        self.conn.execute("BEGIN IMMEDIATE")
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        self.conn.execute("ROLLBACK" if exc_type else "COMMIT")
+        return False
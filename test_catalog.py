@@ -0,0 +1,45 @@
+import asyncio
+
+from catalog import Catalog
+from records import AnimeRecord
+
+T1 = "2026-01-01T00:00:00.000Z"
+T2 = "2026-01-01T00:05:00.000Z"
+T3 = "2026-01-01T00:10:00.000Z"
+
+
+def refresh_lower_bound(catalog):
+    # Chạy refresh với nguồn giả, trả về mốc on_or_after của truy vấn delta
+    filters = []
+
+    async def stream_all(filter, partitioned):
+        filters.append(filter)
+        return
+        yield
+
+    asyncio.run(catalog.refresh(stream_all))
+    return filters[0]["filter"]["last_edited_time"]["on_or_after"]
+
+
+def test_poll_results_do_not_move_delta_watermark():
+    catalog = Catalog()
+    catalog.apply([AnimeRecord("a", ten_romanji="A", last_edited=T1),
+                   AnimeRecord("b", ten_romanji="B", last_edited=T1)])
+    catalog.ready = True
+
+    # A bị bỏ Public lúc T2 (lượt kiểm tra lọc Public nên không thấy), B sửa lúc T3
+    changed = catalog.apply([AnimeRecord("b", ten_romanji="B2", last_edited=T3)], advance_watermark=False)
+    assert [a.page_id for a in changed] == ["b"]
+    assert catalog.records["b"].ten_romanji == "B2"
+    assert catalog.watermark == T1
+
+    # Lượt delta không lọc vẫn quét từ T1 -> bắt được A bị ẩn lúc T2
+    assert refresh_lower_bound(catalog) <= T2
+
+
+def test_unfiltered_apply_advances_watermark():
+    catalog = Catalog()
+    catalog.apply([AnimeRecord("a", ten_romanji="A", last_edited=T1)])
+    catalog.apply([AnimeRecord("a", public=False, last_edited=T2)])
+    assert catalog.watermark == T2
+    assert "a" not in catalog.records
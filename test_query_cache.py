@@ -0,0 +1,28 @@
+import discord
+
+from query_cache import RenderCache
+
+
+def test_render_cache_keeps_empty_description():
+    cache = RenderCache()
+    cache.put(("page", "t1"), discord.Embed(title="🎬 A", description=""))
+
+    embed = cache.get(("page", "t1"))
+    embed.description += "\n**Cùng loạt phim:**\n• B\n"
+    assert embed.description.startswith("\n**Cùng loạt phim:**")
+
+    # Bản trong cache không bị sửa theo
+    assert cache.get(("page", "t1")).description == ""
+
+
+def test_render_cache_returns_copies():
+    cache = RenderCache()
+    cache.put("k", discord.Embed(title="🎬 A", description="**Tên khác:** B\n"))
+
+    first = cache.get("k")
+    first.title = "khác"
+    first.description += "thêm"
+    second = cache.get("k")
+    assert second.title == "🎬 A"
+    assert second.description == "**Tên khác:** B\n"
+    assert (cache.hits, cache.misses) == (2, 0)
@@ -0,0 +1,78 @@
+import pytest
+from search_index import TextIndex, TitleIndex, normalize_title, text_terms
+
+# ==========================================
+# TỪ DỪNG KHÔNG ĐƯỢC NUỐT TỪ THẬT SAU KHI BỎ DẤU
+# ==========================================
+@pytest.mark.parametrize("text, expected", [
+    ("bí ẩn", ["bi", "an", "bi an"]),
+    ("đen", ["den"]),
+    ("chó", ["cho"]),
+    ("thám tử", ["tham", "tu", "tham tu"]),
+    ("bóng đá", ["bong", "da", "bong da"]),
+    ("Người Khổng Lồ", ["nguoi", "khong", "lo", "nguoi khong", "khong lo"]),
+])
+def test_text_terms_keeps_folded_content_words(text, expected):
+    assert text_terms(text) == expected
+
+@pytest.mark.parametrize("text, expected", [
+    ("chó của tôi", ["cho", "toi", "cho toi"]),
+    ("không có gì", ["gi"]),
+])
+def test_text_terms_drops_accented_stop_words(text, expected):
+    assert text_terms(text) == expected
+
+@pytest.fixture
+def text_index():
+    index = TextIndex()
+    index.add("p1", [("Thám tử phá giải những vụ án bí ẩn", 1)])
+    index.add("p2", [("Con chó đen và cậu bé", 1)])
+    index.add("p3", [("Đại Chiến Người Khổng Lồ", 3)])
+    return index
+
+@pytest.mark.parametrize("query, expected", [
+    ("bí ẩn", "p1"),
+    ("đen", "p2"),
+    ("chó", "p2"),
+    ("khổng lồ", "p3"),
+])
+def test_text_search_finds_vietnamese_words(text_index, query, expected):
+    found = [page_id for page_id, _ in text_index.search(query)]
+    assert found and found[0] == expected
+
+# ==========================================
+# TITLE INDEX: KHỚP CHÍNH XÁC KHÔNG BỊ BỎ SÓT KHI TỪ KHOÁ PHỔ BIẾN
+# ==========================================
+@pytest.fixture
+def love_index():
+    index = TitleIndex()
+    for i in range(3000):
+        index.add(f"s{i}", [f"Some Love Story {i}"])
+    index.add("love", ["Love"])
+    index.add("lovely", ["Lovely Days"])
+    return index
+
+def test_title_search_keeps_exact_match_among_many_hits(love_index):
+    found = love_index.search("love", limit=25)
+    assert found[:2] == ["love", "lovely"]
+    assert len(found) == 25
+
+def test_title_search_ranks_like_full_sort(love_index):
+    q = normalize_title("story 1")
+    expected = sorted(
+        (min((0 if k.startswith(q) else 1, len(k)) for k in keys if q in k), page_id)
+        for page_id, keys in love_index.keys.items() if any(q in k for k in keys)
+    )
+    assert love_index.search("Story 1", limit=10) == [page_id for _, page_id in expected[:10]]
+
+def test_title_search_bulk_build_matches_incremental():
+    titles = [(f"p{i}", [f"Kimetsu {i}", f"Thanh Gươm {i}"]) for i in range(50)]
+    bulk, step = TitleIndex(), TitleIndex()
+    for page_id, names in titles:
+        bulk.add(page_id, names, defer=True)
+        step.add(page_id, names)
+    bulk.finish()
+    step.remove("p3")
+    bulk.remove("p3")
+    assert bulk.search("kimetsu", 50) == step.search("kimetsu", 50)
+    assert "p3" not in step.search("kimetsu 3", 50)